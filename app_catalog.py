@@ -0,0 +1,308 @@
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_CATALOG_PATH = os.getenv('APP_CATALOG_PATH', os.path.join(BOT_DIR, 'app_catalog.bin'))
+# Rows gathered for a prefix before ranking; bounds autocomplete latency for very short prefixes.
+SEARCH_CANDIDATE_LIMIT = 300
+
+_APP_CATALOG_MAGIC = b'SBAC\x01\x00\x00\x00'
+# App count, names blob size, token count, tokens blob size, postings count.
+_APP_CATALOG_HEADER = struct.Struct('<IIIII')
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(name):
+    """
+    Splits a game name into lower-case word tokens.
+    """
+    return _TOKEN_PATTERN.findall(name.lower())
+
+
+def _uint32_bytes(values):
+    column = array('I', values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column.tobytes()
+
+
+def _padding(size):
+    return b'\0' * (-size % 4)
+
+
+class _TokenList:
+    """
+    Read-only sequence view of the sorted token table, so bisect can search it without decoding every token.
+    """
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+
+class AppCatalog:
+    """
+    Local catalog of Steam appids and names, bulk-loaded from an app-list dump.
+    Stored as one memory-mapped file: sorted appids, name offsets and a UTF-8 names blob, followed by a sorted
+    token table whose postings list the rows containing each token, shortest names first.
+    Lookups by appid are a binary search; name search bisects the token table for the typed prefix.
+    """
+
+    def __init__(self, path=APP_CATALOG_PATH):
+        self.path = path
+        self._file = None
+        self._mapped = None
+        self._appids = array('I')
+        self.load()
+
+    def load(self):
+        """
+        Memory-maps the catalog file if it exists. Returns True if a catalog was loaded.
+        """
+        if not os.path.exists(self.path) or os.path.getsize(self.path) <= len(_APP_CATALOG_MAGIC):
+            return False
+        self.close()
+        self._file = open(self.path, 'rb')
+        mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(_APP_CATALOG_MAGIC)] != _APP_CATALOG_MAGIC:
+            print(f"[App Catalog] Warning: '{self.path}' is not an app catalog file; ignoring it.")
+            mapped.close()
+            self.close()
+            return False
+        self._mapped = mapped
+
+        offset = len(_APP_CATALOG_MAGIC)
+        app_count, names_size, token_count, tokens_size, postings_count = _APP_CATALOG_HEADER.unpack_from(mapped, offset)
+        offset += _APP_CATALOG_HEADER.size
+        view = memoryview(mapped)
+
+        def uint32_column(count):
+            nonlocal offset
+            column = view[offset:offset + 4 * count]
+            offset += 4 * count
+            if sys.byteorder == 'big':
+                swapped = array('I', column.tobytes())
+                swapped.byteswap()
+                return swapped
+            return column.cast('I')
+
+        def blob(size):
+            nonlocal offset
+            data = view[offset:offset + size]
+            offset += size + len(_padding(size))
+            return data
+
+        self._appids = uint32_column(app_count)
+        self._name_offsets = uint32_column(app_count + 1)
+        self._names = blob(names_size)
+        self._token_offsets = uint32_column(token_count + 1)
+        self._tokens = _TokenList(blob(tokens_size), self._token_offsets)
+        self._posting_offsets = uint32_column(token_count + 1)
+        self._postings = uint32_column(postings_count)
+        print(f"[App Catalog] Loaded {app_count} app(s) from '{self.path}'.")
+        return True
+
+    def close(self):
+        self._appids = array('I')
+        self._name_offsets = self._names = self._token_offsets = self._tokens = None
+        self._posting_offsets = self._postings = None
+        if self._mapped is not None:
+            try:
+                self._mapped.close()
+            except BufferError:
+                # A caller still holds a view into the map; it is released with the last reference.
+                pass
+            self._mapped = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return len(self._appids)
+
+    def _name_length(self, row):
+        return self._name_offsets[row + 1] - self._name_offsets[row]
+
+    def _row_name(self, row):
+        return str(self._names[self._name_offsets[row]:self._name_offsets[row + 1]], 'utf-8')
+
+    def name(self, appid):
+        """
+        Returns the catalog name for an appid, or None if it is not in the catalog.
+        """
+        row = bisect_left(self._appids, int(appid))
+        if row < len(self._appids) and self._appids[row] == int(appid):
+            return self._row_name(row)
+        return None
+
+    def _token_rows(self, token, prefix, limit=None):
+        """
+        Returns the rows containing `token`, shortest names first, or with `prefix`, the rows containing any token
+        that starts with it: the `limit` shortest of them, or all of them in token order when there is no limit.
+        """
+        first = bisect_left(self._tokens, token)
+        if not prefix:
+            if first < len(self._tokens) and self._tokens[first] == token:
+                return self._postings[self._posting_offsets[first]:self._posting_offsets[first + 1]].tolist()
+            return []
+        # Tokens sharing the prefix are adjacent, and so are their postings: one slice covers them all.
+        last = bisect_left(self._tokens, token + '\U0010ffff', first)
+        if limit is None or self._posting_offsets[last] - self._posting_offsets[first] <= limit:
+            return self._postings[self._posting_offsets[first]:self._posting_offsets[last]].tolist()
+        # Each token's postings are sorted shortest name first; merging their heads keeps the shortest names
+        # across every token under the prefix, not just those of the alphabetically first tokens.
+        heads = []
+        for index in range(first, last):
+            start, end = self._posting_offsets[index], self._posting_offsets[index + 1]
+            if start < end:
+                row = self._postings[start]
+                heads.append((self._name_length(row), row, start, end))
+        heapq.heapify(heads)
+        rows = {}
+        while heads and len(rows) < limit:
+            _, row, position, end = heads[0]
+            rows[row] = None
+            if position + 1 < end:
+                next_row = self._postings[position + 1]
+                heapq.heapreplace(heads, (self._name_length(next_row), next_row, position + 1, end))
+            else:
+                heapq.heappop(heads)
+        return list(rows)
+
+    def search(self, query, limit=25):
+        """
+        Returns up to `limit` (appid, name) pairs whose names contain every word of `query`,
+        treating the last word as a prefix (as typed in an autocomplete box).
+        Names starting with the query rank first, then shorter names.
+        """
+        tokens = tokenize(query)
+        if not tokens or not len(self):
+            return []
+        if len(tokens) == 1:
+            candidates = self._token_rows(tokens[0], prefix=True, limit=SEARCH_CANDIDATE_LIMIT)
+        else:
+            # Complete words narrow the search first; the prefix is then checked against all of its rows.
+            candidates = self._token_rows(tokens[0], prefix=False)
+            for token in tokens[1:-1]:
+                required = set(self._token_rows(token, prefix=False))
+                candidates = [row for row in candidates if row in required]
+            prefix = tokens[-1]
+            if len(candidates) <= SEARCH_CANDIDATE_LIMIT:
+                candidates = [row for row in candidates
+                              if any(token.startswith(prefix) for token in tokenize(self._row_name(row)))]
+            else:
+                required = set(self._token_rows(prefix, prefix=True))
+                candidates = [row for row in candidates if row in required][:SEARCH_CANDIDATE_LIMIT]
+            if not candidates:
+                return []
+
+        typed = query.strip().lower()
+        ranked = []
+        for row in dict.fromkeys(candidates):
+            name = self._row_name(row)
+            ranked.append((not name.lower().startswith(typed), len(name), name, self._appids[row]))
+        ranked.sort()
+        return [(appid, name) for _, _, name, appid in ranked[:limit]]
+
+    @staticmethod
+    def build(apps, path=APP_CATALOG_PATH):
+        """
+        Writes a catalog file from (appid, name) pairs, atomically replacing `path`.
+        Later duplicates of an appid win; apps without a name are skipped. Returns the number of apps written.
+        """
+        names_by_appid = {}
+        for appid, name in apps:
+            name = (name or "").strip()
+            if name:
+                names_by_appid[int(appid)] = name
+        appids = sorted(names_by_appid)
+
+        encoded_names = [names_by_appid[appid].encode('utf-8') for appid in appids]
+        name_offsets = [0]
+        for encoded in encoded_names:
+            name_offsets.append(name_offsets[-1] + len(encoded))
+        names_blob = b''.join(encoded_names)
+
+        rows_by_token = {}
+        for row, appid in enumerate(appids):
+            for token in set(tokenize(names_by_appid[appid])):
+                rows_by_token.setdefault(token, []).append(row)
+        tokens = sorted(rows_by_token)
+        encoded_tokens = [token.encode('utf-8') for token in tokens]
+        token_offsets = [0]
+        for encoded in encoded_tokens:
+            token_offsets.append(token_offsets[-1] + len(encoded))
+        tokens_blob = b''.join(encoded_tokens)
+        posting_offsets = [0]
+        postings = []
+        for token in tokens:
+            rows = sorted(rows_by_token[token], key=lambda row: (len(encoded_names[row]), row))
+            postings.extend(rows)
+            posting_offsets.append(len(postings))
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_APP_CATALOG_MAGIC)
+            f.write(_APP_CATALOG_HEADER.pack(len(appids), len(names_blob), len(tokens), len(tokens_blob), len(postings)))
+            f.write(_uint32_bytes(appids))
+            f.write(_uint32_bytes(name_offsets))
+            f.write(names_blob + _padding(len(names_blob)))
+            f.write(_uint32_bytes(token_offsets))
+            f.write(tokens_blob + _padding(len(tokens_blob)))
+            f.write(_uint32_bytes(posting_offsets))
+            f.write(_uint32_bytes(postings))
+        os.replace(tmp_path, path)
+        return len(appids)
+
+
+def read_app_list_dump(path):
+    """
+    Yields (appid, name) pairs from a Steam app-list dump: the JSON returned by ISteamApps/GetAppList
+    ({"applist": {"apps": [...]}}), IStoreService/GetAppList ({"response": {"apps": [...]}}) or a bare list.
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = (data.get("applist") or data.get("response") or {}).get("apps", [])
+    for app in data:
+        if "appid" in app:
+            yield app["appid"], app.get("name")
+
+
+_app_catalog = None
+
+
+def get_app_catalog():
+    """
+    Returns the process-wide AppCatalog; it is empty until a dump has been imported.
+    """
+    global _app_catalog
+    if _app_catalog is None:
+        _app_catalog = AppCatalog()
+    return _app_catalog
+
+
+def import_app_list_dump(dump_path, path=APP_CATALOG_PATH):
+    """
+    Builds the catalog file from a Steam app-list dump and reloads the process-wide catalog if it uses that file.
+    Returns the number of apps written.
+    """
+    count = AppCatalog.build(read_app_list_dump(dump_path), path)
+    if _app_catalog is not None and _app_catalog.path == path:
+        _app_catalog.load()
+    return count
+
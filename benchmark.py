@@ -0,0 +1,373 @@
+"""
+Offline end-to-end benchmark for the bot's command handlers.
+
+Drives letsplay, link_steam and on_member_join with stub Discord objects while
+steam_api_manager talks to a local fake Steam HTTP server, member_storage uses
+a temporary SQLite file and its Sheets mirror uses an in-memory worksheet. Reports p50/p95/p99 latency and API call counts
+per scenario.
+
+    python benchmark.py --iterations 5 --latency 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from aiohttp import web
+
+import app_catalog
+import bot
+import cache_manager
+import member_storage
+import query_engine
+import sheets_manager
+import steam_api_manager
+from fake_sheets import FakeWorksheet
+
+
+FAKE_STEAM_HOST = "127.0.0.1"
+FIRST_FAKE_STEAM_ID = 76561190000000000
+BENCHMARK_GUILD_ID = 4242
+MULTIPLAYER_CATEGORIES = [{"id": 1, "description": "Multi-player"}, {"id": 38, "description": "Online Co-op"}]
+SINGLE_PLAYER_CATEGORIES = [{"id": 2, "description": "Single-player"}]
+
+
+class FakeSteamServer:
+    """
+    Local stand-in for GetOwnedGames and store appdetails.
+    Adds `latency` seconds per request and answers 429 with Retry-After once `rate_limit` requests/s is exceeded.
+    """
+
+    def __init__(self, latency=0.05, rate_limit=None):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.libraries = {}
+        self.calls = Counter()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._runner = None
+        self.port = None
+
+    def _throttled(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 1:
+            self._window_start = now
+            self._window_count = 0
+        self._window_count += 1
+        return self._window_count > self.rate_limit
+
+    async def _owned_games(self, request):
+        self.calls["GetOwnedGames"] += 1
+        await asyncio.sleep(self.latency)
+        if self._throttled():
+            self.calls["429"] += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        appids = self.libraries.get(request.query.get("steamid"), [])
+        games = [{"appid": appid, "playtime_forever": 0} for appid in appids]
+        if request.query.get("include_appinfo") == "1":
+            games = [dict(game, name=f"Game {game['appid']}") for game in games]
+        return web.json_response({"response": {"game_count": len(games), "games": games}})
+
+    async def _app_details(self, request):
+        self.calls["appdetails"] += 1
+        await asyncio.sleep(self.latency)
+        if self._throttled():
+            self.calls["429"] += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        appid = request.query["appids"]
+        categories = MULTIPLAYER_CATEGORIES if int(appid) % 2 == 0 else SINGLE_PLAYER_CATEGORIES
+        return web.json_response({appid: {"success": True, "data": {
+            "steam_appid": int(appid),
+            "name": f"Game {appid}",
+            "header_image": f"https://cdn.example/{appid}/header.jpg",
+            "categories": categories,
+        }}})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/IPlayerService/GetOwnedGames/v1/", self._owned_games)
+        app.router.add_get("/api/appdetails", self._app_details)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, FAKE_STEAM_HOST, 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+class StubMessage:
+    def __init__(self, calls):
+        self._calls = calls
+
+    async def edit(self, **kwargs):
+        self._calls["message.edit"] += 1
+
+
+class StubResponse:
+    def __init__(self, calls):
+        self._calls = calls
+
+    async def defer(self, **kwargs):
+        self._calls["response.defer"] += 1
+
+    async def send_message(self, *args, **kwargs):
+        self._calls["response.send_message"] += 1
+
+    async def send_modal(self, modal):
+        self._calls["response.send_modal"] += 1
+
+
+class StubFollowup:
+    def __init__(self, calls):
+        self._calls = calls
+
+    async def send(self, *args, **kwargs):
+        self._calls["followup.send"] += 1
+        return StubMessage(self._calls)
+
+
+class StubGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class StubMember:
+    def __init__(self, member_id, name=None):
+        self.id = member_id
+        self.guild = StubGuild(BENCHMARK_GUILD_ID)
+        self.name = name or f"player{member_id}"
+        self.mention = f"<@{member_id}>"
+        self.bot = False
+
+
+class StubInteraction:
+    def __init__(self, user):
+        self.user = user
+        self.guild_id = BENCHMARK_GUILD_ID
+        self.calls = Counter()
+        self.response = StubResponse(self.calls)
+        self.followup = StubFollowup(self.calls)
+
+    async def edit_original_response(self, **kwargs):
+        self.calls["edit_original_response"] += 1
+        return StubMessage(self.calls)
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.steam = FakeSteamServer(latency=args.latency, rate_limit=args.server_rate_limit)
+        self.worksheet = FakeWorksheet(latency=args.sheets_latency)
+        self.cache_dir = tempfile.mkdtemp(prefix="steambot-bench-")
+        self._next_member_id = 1000
+
+    async def start(self):
+        await self.steam.start()
+        steam_api_manager.STEAM_API_BASE_URL = f"http://{FAKE_STEAM_HOST}:{self.steam.port}/"
+        steam_api_manager.STEAM_STORE_API_URL = f"http://{FAKE_STEAM_HOST}:{self.steam.port}/api/"
+        steam_api_manager.STEAM_API_KEY = "benchmark"
+        steam_api_manager.STORE_API_RATE = self.args.client_rate
+        steam_api_manager.STORE_API_BURST = int(self.args.client_rate)
+        steam_api_manager.WEB_API_RATE = self.args.client_rate
+        steam_api_manager.WEB_API_BURST = int(self.args.client_rate)
+        self.sheet = sheets_manager.get_member_sheet(BENCHMARK_GUILD_ID)
+        self.sheet.worksheet = self.worksheet
+        member_storage.MEMBER_DB_PATH = os.path.join(self.cache_dir, "members.sqlite3")
+        member_storage.MEMBER_DB_DIR = self.cache_dir
+        app_catalog._app_catalog = app_catalog.AppCatalog(path=os.path.join(self.cache_dir, "app_catalog.bin"))
+        await self.reset_caches()
+
+    async def stop(self):
+        await self.finish_background_lookups()
+        await steam_api_manager.close_client()
+        for store in member_storage._stores.values():
+            store.close()
+        await self.steam.stop()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    async def finish_background_lookups(self):
+        """
+        Waits for Steam lookups that outlived a query's deadline, cancelling any still running after another
+        deadline, so none of them hits a closed client or fills the next run's caches.
+        """
+        pending = list(query_engine.background_lookups)
+        if not pending:
+            return
+        _, still_running = await asyncio.wait(pending, timeout=query_engine.LETSPLAY_DEADLINE)
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*still_running, return_exceptions=True)
+
+    async def reset_caches(self):
+        """
+        Points every cache at fresh, empty storage so the next run starts cold.
+        """
+        await self.finish_background_lookups()
+        if cache_manager._app_details_cache is not None:
+            cache_manager._app_details_cache.close()
+        db_path = os.path.join(self.cache_dir, f"cache-{time.monotonic_ns()}.sqlite3")
+        cache_manager._app_details_cache = cache_manager.AppDetailsCache(path=db_path)
+        if cache_manager._library_cache is not None:
+            cache_manager._library_cache.close()
+        cache_manager._library_cache = cache_manager.LibraryCache(path=db_path)
+        cache_manager._category_index = cache_manager.CategoryIndex(
+            path=os.path.join(self.cache_dir, f"index-{time.monotonic_ns()}.bin")
+        )
+        await steam_api_manager.close_client()
+        cache_manager._group_result_cache = None
+        cache_manager._ownership_index = None
+        steam_api_manager._client = None
+        self.sheet.directory = None
+
+    def add_member(self, steam_id=None):
+        member = StubMember(self._next_member_id)
+        self._next_member_id += 1
+        self.worksheet.rows.append([member.name, str(member.id), steam_id or ""])
+        member_storage.get_store(BENCHMARK_GUILD_ID).import_from_sheet(
+            {str(member.id): {"username": member.name, "steam_id": steam_id or None}}
+        )
+        self.sheet.directory = None
+        return member
+
+    def make_group(self, players, common_games, unique_games):
+        """
+        Creates `players` linked members whose libraries share exactly `common_games` appids.
+        """
+        members = []
+        common = list(range(10, 10 + common_games))
+        for index in range(players):
+            steam_id = str(FIRST_FAKE_STEAM_ID + self._next_member_id)
+            unique_start = 1_000_000 * (index + 1)
+            library = common + list(range(unique_start, unique_start + unique_games))
+            random.shuffle(library)
+            self.steam.libraries[steam_id] = library
+            members.append(self.add_member(steam_id))
+        return members
+
+    def _snapshot(self):
+        return Counter(self.steam.calls) + Counter({f"sheets.{k}": v for k, v in self.worksheet.calls.items()})
+
+    async def measure(self, name, run_once, iterations, cold):
+        latencies = []
+        totals = Counter()
+        for _ in range(iterations):
+            if cold:
+                await self.reset_caches()
+            before = self._snapshot()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                discord_calls = await run_once()
+            latencies.append(time.perf_counter() - start)
+            totals += self._snapshot() - before
+            totals += Counter({f"discord.{k}": v for k, v in discord_calls.items()})
+        return {
+            "scenario": name,
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "calls": {key: value / iterations for key, value in sorted(totals.items())},
+        }
+
+    async def letsplay_scenario(self, players, common_games, cold):
+        members = self.make_group(players, common_games, self.args.unique_games)
+
+        async def run_once():
+            interaction = StubInteraction(members[0])
+            await bot.letsplay.callback(interaction, *members[1:])
+            return interaction.calls
+
+        if not cold:
+            with contextlib.redirect_stdout(io.StringIO()):
+                await run_once()
+        label = f"letsplay players={players} common={common_games} {'cold' if cold else 'warm'}"
+        return await self.measure(label, run_once, self.args.iterations, cold)
+
+    async def link_steam_scenario(self, cold):
+        linked = self.add_member(str(FIRST_FAKE_STEAM_ID))
+        unlinked = self.add_member()
+
+        async def run_once():
+            calls = Counter()
+            for member in (linked, unlinked):
+                interaction = StubInteraction(member)
+                await bot.link_steam.callback(interaction)
+                calls += interaction.calls
+            return calls
+
+        label = f"link_steam {'cold' if cold else 'warm'}"
+        return await self.measure(label, run_once, self.args.iterations, cold)
+
+    async def member_join_scenario(self, joins):
+        async def run_once():
+            for _ in range(joins):
+                member = StubMember(self._next_member_id)
+                self._next_member_id += 1
+                await bot.on_member_join(member)
+            await asyncio.to_thread(member_storage.sync_with_sheets, BENCHMARK_GUILD_ID)
+            await asyncio.to_thread(sheets_manager.flush_pending_writes)
+            return Counter()
+
+        return await self.measure(f"on_member_join x{joins} + mirror flush", run_once, self.args.iterations, cold=False)
+
+
+def _print_report(results):
+    print(f"{'scenario':<45} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  calls/run")
+    for result in results:
+        calls = ", ".join(f"{key}={value:g}" for key, value in result["calls"].items())
+        print(f"{result['scenario']:<45} {result['p50'] * 1000:>9.1f} {result['p95'] * 1000:>9.1f} "
+              f"{result['p99'] * 1000:>9.1f}  {calls}")
+
+
+async def run(args):
+    harness = Harness(args)
+    await harness.start()
+    results = []
+    try:
+        for players in args.players:
+            for common_games in args.common_games:
+                for cold in (True, False):
+                    results.append(await harness.letsplay_scenario(players, common_games, cold))
+        results.append(await harness.link_steam_scenario(cold=True))
+        results.append(await harness.link_steam_scenario(cold=False))
+        results.append(await harness.member_join_scenario(args.joins))
+    finally:
+        await harness.stop()
+    _print_report(results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for SteamBot command handlers.")
+    parser.add_argument("--iterations", type=int, default=5, help="Measured runs per scenario.")
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 5], help="Group sizes to benchmark.")
+    parser.add_argument("--common-games", type=int, nargs="+", default=[10, 1000], help="Common library sizes.")
+    parser.add_argument("--unique-games", type=int, default=2000, help="Extra games per player outside the overlap.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake Steam latency per request, in seconds.")
+    parser.add_argument("--sheets-latency", type=float, default=0.2, help="Fake Sheets latency per call, in seconds.")
+    parser.add_argument("--server-rate-limit", type=int, default=200,
+                        help="Requests per second the fake Steam server allows before answering 429.")
+    parser.add_argument("--client-rate", type=float, default=150,
+                        help="Store and Web API rate the bot's limiters are configured for.")
+    parser.add_argument("--joins", type=int, default=50, help="Members joining per on_member_join run.")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+import hashlib
+import io
+import json
 import os
 import re
 from dotenv import load_dotenv
@@ -5,10 +8,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import discord  # noqa: E402
-from discord.ext import commands  # noqa: E402
+from discord.ext import commands, tasks  # noqa: E402
 from discord import app_commands  # noqa: E402
 import random  # noqa: E402
-
+import asyncio  # noqa: E402
+import time  # noqa: E402
+
+import app_catalog  # noqa: E402
+import cache_manager  # noqa: E402
+import cache_warmer  # noqa: E402
+import loop_watchdog  # noqa: E402
+import member_storage  # noqa: E402
+import metrics  # noqa: E402
+import query_engine  # noqa: E402
 import sheets_manager  # noqa: E402
 import steam_api_manager  # noqa: E402
 
@@ -16,48 +28,430 @@ import steam_api_manager  # noqa: E402
 TOKEN = os.getenv('DISCORD_TOKEN')
 STEAM_API_KEY = os.getenv('STEAM_API_KEY')
 ADMIN_ID = os.getenv('ADMIN_ID')
+# Number of gateway shards; leave unset to use the count Discord recommends.
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+# Where the hash of the last successfully synced command tree is kept between restarts.
+COMMAND_TREE_HASH_PATH = os.getenv(
+    'COMMAND_TREE_HASH_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'command_tree.sha256')
+)
+# Seconds each startup phase may take before the bot connects without it; setup_hook runs before the gateway login.
+STARTUP_PHASE_TIMEOUT = float(os.getenv('STARTUP_PHASE_TIMEOUT', 15))
 
 
 intents = discord.Intents.default()
 intents.members = True
+# Presence updates are a privileged intent; enable them in the developer portal before setting this.
+intents.presences = os.getenv('ENABLE_PRESENCE_INTENT', '').lower() in ('1', 'true', 'yes')
 
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """
+    Command tree that times every slash command end to end and counts failures.
+    Also labels the command's task so the loop watchdog can attribute event-loop stalls to it.
+    """
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started_at"] = time.perf_counter()
+        if interaction.command:
+            loop_watchdog.watchdog.label_current_task(f"command:{interaction.command.name}")
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        started_at = interaction.extras.get("started_at")
+        if interaction.command and started_at is not None:
+            metrics.registry.observe("command", interaction.command.name, time.perf_counter() - started_at, error=True)
+        await super().on_error(interaction, error)
+
+
+class SteamBot(commands.AutoShardedBot):
+    async def setup_hook(self):
+        """
+        Starts background tasks before the bot connects to Discord, and concurrently syncs slash commands (if they
+        changed), starts the metrics exporter and warms the Sheets connection, local caches and Steam connection pool.
+        """
+        start = time.perf_counter()
+        if loop_watchdog.LOOP_WATCHDOG_ENABLED:
+            loop_watchdog.watchdog.start()
+        flush_sheet_writes.start()
+        if member_storage.MEMBER_STORAGE_BACKEND != 'sheets':
+            mirror_member_storage.start()
+        metrics.registry.register_cache("app_details", lambda: cache_manager.get_app_details_cache().stats())
+        metrics.registry.register_cache("library", lambda: cache_manager.get_library_cache().stats())
+        metrics.registry.register_cache("group_result", lambda: cache_manager.get_group_result_cache().stats())
+
+        async def warm_steam():
+            await timed_startup_phase("local caches", asyncio.to_thread(cache_manager.load_local_caches))
+            await timed_startup_phase("steam connection pool", steam_api_manager.warm_up())
+
+        self.metrics_runner, *_ = await asyncio.gather(
+            timed_startup_phase("metrics exporter", metrics.start_exporter()),
+            timed_startup_phase("command sync", sync_command_tree(self.tree)),
+            timed_startup_phase("sheets connection", asyncio.to_thread(sheets_manager.warm_up)),
+            timed_startup_phase("member storage", asyncio.to_thread(member_storage.get_store)),
+            warm_steam(),
+        )
+        print(f"[Startup] setup_hook finished in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    async def close(self):
+        """
+        Flushes queued Google Sheet writes and closes the shared Steam HTTP connection pool before disconnecting.
+        """
+        flush_sheet_writes.cancel()
+        warm_caches.cancel()
+        mirror_member_storage.cancel()
+        await asyncio.to_thread(sync_member_storage, member_storage_guild_ids())
+        if sheets_manager.get_pending_write_count():
+            print(f"Flushing {sheets_manager.get_pending_write_count()} pending Google Sheet write(s) before shutdown...")
+            await asyncio.to_thread(sheets_manager.flush_pending_writes)
+        await steam_api_manager.close_client()
+        await asyncio.to_thread(cache_manager.flush_caches)
+        cache_manager.get_category_index().save_if_dirty()
+        if getattr(self, "metrics_runner", None):
+            await self.metrics_runner.cleanup()
+        loop_watchdog.watchdog.stop()
+        await super().close()
+
+
+bot = SteamBot(command_prefix='!', intents=intents, tree_cls=InstrumentedCommandTree, shard_count=SHARD_COUNT)
+
+# Minimum seconds between two progress edits of the same command's response.
+PROGRESS_EDIT_INTERVAL = float(os.getenv('PROGRESS_EDIT_INTERVAL', 1.5))
+GAMES_PER_PAGE = 20
 
 admin_mention = f"<@{ADMIN_ID}>"
 
 
+async def timed_startup_phase(name, awaitable, timeout=STARTUP_PHASE_TIMEOUT):
+    """
+    Awaits one startup phase for at most `timeout` seconds, logging and recording how long it took.
+    Failures and timeouts are logged, not raised, so one slow or broken dependency (e.g. a hung Google auth)
+    does not keep the bot offline; the dependency is opened lazily on first use instead.
+    Returns the phase's result or None.
+    """
+    start = time.perf_counter()
+    failed = False
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        failed = True
+        print(f"[Startup] {name} timed out after {timeout:g}s; continuing without it.")
+    except Exception as e:
+        failed = True
+        print(f"[Startup] {name} failed: {type(e).__name__}: {e}")
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.registry.observe("startup", name, elapsed, error=failed)
+        print(f"[Startup] {name}: {elapsed * 1000:.0f} ms")
+
+
+def command_tree_hash(tree, application_id):
+    """
+    Returns a stable hash of the global command definitions as they would be sent to Discord.
+    """
+    payload = {
+        "application_id": application_id,
+        "commands": sorted((command.to_dict(tree) for command in tree.get_commands(type=None)),
+                           key=lambda command: (command.get("type", 1), command["name"])),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+async def sync_command_tree(tree):
+    """
+    Syncs global slash commands only if their definitions changed since the last successful sync.
+    Returns True if a sync was performed.
+    """
+    digest = command_tree_hash(tree, tree.client.application_id)
+    try:
+        with open(COMMAND_TREE_HASH_PATH, encoding="utf-8") as f:
+            if f.read().strip() == digest:
+                print("Global slash commands unchanged; skipping sync.")
+                return False
+    except OSError:
+        pass
+
+    await tree.sync()
+    try:
+        with open(COMMAND_TREE_HASH_PATH, "w", encoding="utf-8") as f:
+            f.write(digest)
+    except OSError as e:
+        print(f"Warning: could not record the synced command tree hash: {e}")
+    print("Global slash commands synced.")
+    return True
+
+
+class ProgressReporter:
+    """
+    Coalesces a command's progress updates and warnings into one status embed on its original (deferred) response.
+    Edits are throttled to one per `min_interval` seconds, counted from the start of the command, so commands that
+    finish within the first window cost a single edit. Updates arriving in between only change the state and the
+    latest state is sent when the window ends. finish() posts the final answer.
+    """
+
+    def __init__(self, interaction: discord.Interaction, title, min_interval=PROGRESS_EDIT_INTERVAL):
+        self.interaction = interaction
+        self.title = title
+        self.min_interval = min_interval
+        self.status = None
+        self.warnings = []
+        self.published = False
+        self._dirty = False
+        self._last_edit = time.monotonic()
+        self._pending = None
+
+    def status_embed(self):
+        """
+        Returns the embed showing the latest status and every warning, or None if there is nothing to show.
+        """
+        lines = [self.status] if self.status else []
+        lines.extend(f"⚠️ {warning}" for warning in self.warnings)
+        if not lines:
+            return None
+        description = "\n".join(lines)
+        # Leaves room for the results page in the same message (Discord caps a message's embeds at 6000 characters).
+        if len(description) > 3000:
+            description = description[:3000] + "..."
+        color = discord.Color.orange() if self.warnings else discord.Color.light_grey()
+        return discord.Embed(title=self.title, description=description, color=color)
+
+    def update(self, status):
+        self.status = status
+        self._schedule()
+
+    def warn(self, message):
+        self.warnings.append(message)
+        self._schedule()
+
+    def _schedule(self):
+        self._dirty = True
+        if self._pending is None or self._pending.done():
+            self._pending = asyncio.create_task(self._publish_later())
+
+    async def _publish_later(self):
+        delay = self._last_edit + self.min_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._publish()
+
+    async def _publish(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        self._last_edit = time.monotonic()
+        self.published = True
+        try:
+            await edit_original_response(self.interaction, embed=self.status_embed())
+        except discord.HTTPException as e:
+            print(f"Warning: could not update command progress: {e}")
+
+    def closing_embeds(self):
+        """
+        Returns the status embed to include with the final answer: only when the answer will replace the original
+        response and there are warnings to keep.
+        """
+        if self.published or not self.warnings:
+            return []
+        self.status = None
+        return [self.status_embed()]
+
+    async def finish(self, content=None, embeds=(), view=None):
+        """
+        Cancels pending progress edits and posts the final answer. If nothing has been shown yet the answer replaces
+        the original response (one edit); otherwise the status embed is settled and the answer is sent as a followup,
+        so its mentions still notify. Returns the message carrying the answer.
+        """
+        if self._pending is not None:
+            self._pending.cancel()
+        if not self.published:
+            self.published = True
+            return await edit_original_response(self.interaction, content=content, embeds=list(embeds), view=view)
+
+        self.status = "✅ Done."
+        self._dirty = True
+        await self._publish()
+        kwargs = {"content": content, "embeds": list(embeds), "wait": True}
+        if view is not None:
+            kwargs["view"] = view
+        return await send_followup(self.interaction, **kwargs)
+
+
+async def send_followup(interaction: discord.Interaction, *args, **kwargs):
+    """
+    Sends an interaction followup, recording its latency.
+    """
+    with metrics.timed("discord", "followup.send"):
+        return await interaction.followup.send(*args, **kwargs)
+
+
+async def edit_original_response(interaction: discord.Interaction, **kwargs):
+    """
+    Edits the original interaction response, recording its latency.
+    """
+    with metrics.timed("discord", "edit_original_response"):
+        return await interaction.edit_original_response(**kwargs)
+
+
+@tasks.loop(seconds=sheets_manager.SHEETS_FLUSH_INTERVAL)
+async def flush_sheet_writes():
+    """
+    Periodically writes queued member additions and Steam ID updates to the Google Sheet,
+    and the local caches' queued access times and library changes to their database.
+    """
+    if sheets_manager.get_pending_write_count():
+        await asyncio.to_thread(sheets_manager.flush_pending_writes)
+    await asyncio.to_thread(cache_manager.flush_caches)
+
+
+def member_storage_guild_ids():
+    """
+    Returns the guilds whose member stores are kept in sync: the legacy, guild-less store plus every joined guild.
+    """
+    return [None] + [guild.id for guild in bot.guilds]
+
+
+def sync_member_storage(guild_ids, max_reads=member_storage.MEMBER_MIRROR_MAX_READS):
+    """
+    Mirrors the member stores of the guilds that need it (see member_storage.guilds_to_mirror) with their worksheets.
+    A failing guild does not stop the others.
+    Blocking; call it from a worker thread.
+    """
+    for guild_id in member_storage.guilds_to_mirror(guild_ids, max_reads=max_reads):
+        try:
+            member_storage.sync_with_sheets(guild_id)
+        except Exception as e:
+            print(f"[Member Storage] Sheet mirror sync failed for guild {guild_id}: {type(e).__name__}: {e}")
+
+
+@tasks.loop(seconds=member_storage.MEMBER_MIRROR_INTERVAL)
+async def mirror_member_storage():
+    """
+    Keeps the Google Sheets in sync with the local member stores, in both directions.
+    """
+    await asyncio.to_thread(sync_member_storage, member_storage_guild_ids())
+
+
+async def reconcile_guild_members(guild):
+    """
+    Streams a guild's member list and adds everyone missing from its member store in one batched write.
+    Returns (True, number of members added) or (False, message).
+    """
+    start = time.perf_counter()
+    members = []
+    with metrics.timed("discord", "fetch_members"):
+        async for member in guild.fetch_members(limit=None):
+            if not member.bot:
+                members.append((member.name, member.id))
+    success, result = await asyncio.to_thread(member_storage.reconcile_members, members, guild.id)
+    print(f"[Member Storage] Reconciled {guild.name} ({guild.id}): {len(members)} member(s) fetched, "
+          f"{f'{result} added' if success else 'failed: ' + result} in {time.perf_counter() - start:.1f}s.")
+    return success, result
+
+
+async def reconcile_all_guilds():
+    """
+    Reconciles every guild's member store, one guild at a time.
+    """
+    for guild in list(bot.guilds):
+        try:
+            await reconcile_guild_members(guild)
+        except Exception as e:
+            print(f"[Member Storage] Reconciliation failed for {guild.name} ({guild.id}): {type(e).__name__}: {e}")
+
+
+# Running reconcile_all_guilds() tasks, referenced so they are not garbage-collected mid-run.
+reconcile_tasks = set()
+
+
+def schedule_reconcile_all_guilds():
+    """
+    Starts reconcile_all_guilds() in the background unless a previous run is still going.
+    Returns the new task, or None if one was already running.
+    """
+    if reconcile_tasks:
+        return None
+    task = asyncio.create_task(reconcile_all_guilds())
+    reconcile_tasks.add(task)
+    task.add_done_callback(reconcile_tasks.discard)
+    return task
+
+
+@tasks.loop(minutes=cache_warmer.WARMER_INTERVAL_MINUTES)
+async def warm_caches():
+    """
+    Periodically refreshes linked members' libraries and their most shared games' details.
+    """
+    try:
+        await cache_warmer.warmer.run_once(guild_ids=member_storage_guild_ids())
+    except Exception as e:
+        print(f"[Cache Warmer] Warm-up run failed: {type(e).__name__}: {e}")
+
+
 @bot.event
 async def on_ready():
     """
-    Called when the bot successfully connects to Discord.
-    Syncs slash commands when the bot is ready.
+    Called when the bot successfully connects to Discord (and again after reconnects).
+    Reconciles the member stores and starts the cache warmer; slash commands are synced once in setup_hook.
     """
-    print(f'Logged in as {bot.user} (ID: {bot.user.id})')
+    print(f'Logged in as {bot.user} (ID: {bot.user.id}) with {bot.shard_count} shard(s)')
     print('------')
     print(f'Bot is in {len(bot.guilds)} guild(s):')
     for guild in bot.guilds:
         print(f'- {guild.name} (ID: {guild.id})')
     print('------')
 
-    await bot.tree.sync()
-    print("Global slash commands synced.")
+    # After a reconnect this also picks up members who joined while the bot was offline.
+    schedule_reconcile_all_guilds()
+
+    if not warm_caches.is_running():
+        warm_caches.start()
+
+
+@bot.event
+async def on_guild_join(guild):
+    """
+    Adds the members of a newly joined guild to its member store.
+    """
+    try:
+        await reconcile_guild_members(guild)
+    except Exception as e:
+        print(f"[Member Storage] Reconciliation failed for {guild.name} ({guild.id}): {type(e).__name__}: {e}")
+
+
+@bot.event
+async def on_shard_ready(shard_id):
+    """
+    Called when one gateway shard has connected and received its guilds.
+    """
+    guild_count = sum(1 for guild in bot.guilds if guild.shard_id == shard_id)
+    print(f'Shard {shard_id} ready with {guild_count} guild(s).')
+
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    """
+    Records the end-to-end latency of a successfully completed slash command.
+    """
+    started_at = interaction.extras.get("started_at")
+    if started_at is not None:
+        metrics.registry.observe("command", command.name, time.perf_counter() - started_at)
 
 
 @bot.event
 async def on_member_join(member):
     """
-    Adds a new user to the Google Sheet when they join the server.
+    Adds a new user to member storage (and, through the mirror, the Google Sheet) when they join the server.
     """
     if member.bot:
         return
     
-    success, message = sheets_manager.add_new_user(member.name, member.id)
+    success, message = await asyncio.to_thread(
+        member_storage.add_new_discord_user, member.name, member.id, member.guild.id
+    )
 
     if success:
-        print(f"Successfully added {member.name} ({member.id}) to the Google Sheet: {message}")
+        print(f"Successfully added {member.name} ({member.id}) to member storage: {message}")
     else:
-        print(f"Failed to add {member.name} ({member.id}) to the Google Sheet: {message}")
+        print(f"Failed to add {member.name} ({member.id}) to member storage: {message}")
 
 
 @bot.tree.command(name="ping", description="Pings the bot to check if it's online.")
@@ -72,10 +466,10 @@ async def ping_command(interaction: discord.Interaction):
 async def show_sheet_members(interaction: discord.Interaction):
     await interaction.response.defer()
 
-    members_data = sheets_manager.get_all_members_data()
+    members_data = await asyncio.to_thread(member_storage.get_all_members_data, interaction.guild_id)
 
     if not members_data:
-        await interaction.followup.send("The Google Sheet is empty or could not be accessed.")
+        await send_followup(interaction, "The Google Sheet is empty or could not be accessed.")
         return
 
     response_message = "Current members in the Google Sheet:\n"
@@ -88,7 +482,182 @@ async def show_sheet_members(interaction: discord.Interaction):
     if len(response_message) > 1990:
         response_message = response_message[:1990] + "...\n(Message truncated due to length limit)"
 
-    await interaction.followup.send(response_message)
+    await send_followup(interaction, response_message)
+
+
+@bot.tree.command(name="bot-stats", description="Shows latency, error and cache statistics (admin only).")
+async def bot_stats(interaction: discord.Interaction):
+    if str(interaction.user.id) != str(ADMIN_ID):
+        await interaction.response.send_message("This command is restricted to the bot admin.", ephemeral=True)
+        return
+
+    summary = metrics.registry.format_summary()
+    summary += f"\nPending sheet writes: {sheets_manager.get_pending_write_count()}"
+    single_flight = steam_api_manager.get_single_flight_stats()
+    summary += f"\nSteam lookups deduplicated: {single_flight['deduplicated']}/{single_flight['calls']}"
+    for endpoint, stats in steam_api_manager.get_rate_limit_stats().items():
+        summary += (f"\nRate limiter {endpoint}: {stats['requests']} requests, "
+                    f"{stats['total_wait_time']:.1f}s waiting, {stats['throttled']} throttled")
+    for endpoint, stats in steam_api_manager.get_circuit_breaker_stats().items():
+        summary += (f"\nCircuit {endpoint}: {'OPEN' if stats['open'] else 'closed'}, "
+                    f"opened {stats['times_opened']}x, {stats['rejected']} requests failed fast")
+    ownership = cache_manager.get_ownership_index().stats()
+    summary += f"\nOwnership index: {ownership['members']} libraries, {ownership['apps']} apps"
+    guild_budgets = steam_api_manager.get_guild_budget_stats()
+    busiest = sorted(guild_budgets.items(), key=lambda item: item[1]['requests'], reverse=True)[:5]
+    loop_lag = loop_watchdog.watchdog.stats()
+    summary += (f"\nEvent loop lag: p95 {loop_lag['p95_lag'] * 1000:.1f} ms, max {loop_lag['max_lag'] * 1000:.0f} ms, "
+                f"{loop_lag['stalls']} stall(s); see /loop-lag-report")
+    summary += f"\nShards: {bot.shard_count}, guilds: {len(bot.guilds)}, guild budgets in use: {len(guild_budgets)}"
+    for guild_id, stats in busiest:
+        summary += f"\nGuild {guild_id}: {stats['requests']} requests, {stats['total_wait_time']:.1f}s waiting"
+
+    if len(summary) > 1950:
+        summary = summary[:1950] + "\n..."
+    await interaction.response.send_message(f"```\n{summary}\n```", ephemeral=True)
+
+
+@bot.tree.command(name="loop-lag-report", description="Dumps the event-loop stall report (admin only).")
+async def loop_lag_report(interaction: discord.Interaction):
+    if str(interaction.user.id) != str(ADMIN_ID):
+        await interaction.response.send_message("This command is restricted to the bot admin.", ephemeral=True)
+        return
+
+    report = loop_watchdog.watchdog.format_report()
+    if len(report) <= 1950:
+        await interaction.response.send_message(f"```\n{report}\n```", ephemeral=True)
+        return
+    await interaction.response.send_message(
+        "Event-loop stall report attached.",
+        file=discord.File(io.BytesIO(report.encode("utf-8")), filename="loop-lag-report.txt"),
+        ephemeral=True,
+    )
+
+
+@bot.tree.command(name="reconcile-members", description="Adds server members missing from member storage (admin only).")
+async def reconcile_members_command(interaction: discord.Interaction):
+    if str(interaction.user.id) != str(ADMIN_ID):
+        await interaction.response.send_message("This command is restricted to the bot admin.", ephemeral=True)
+        return
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    success, result = await reconcile_guild_members(interaction.guild)
+    if success:
+        await send_followup(interaction, f"Member reconciliation finished: {result} missing member(s) added.", ephemeral=True)
+    else:
+        await send_followup(interaction, f"Member reconciliation failed: {result}", ephemeral=True)
+
+
+async def get_linked_steam_ids(guild_id):
+    """
+    Returns {steam_id: discord_id} for every member of a guild who has linked a Steam account.
+    Rows whose Discord ID is not a number (e.g. hand-edited in the sheet) are skipped.
+    """
+    members = await asyncio.to_thread(member_storage.get_all_members_data, guild_id)
+    linked = {}
+    for member in members:
+        steam_id = str(member.get("Steam ID", "")).strip()
+        discord_id = str(member.get("Discord ID", "")).strip()
+        if steam_id and discord_id.isdigit():
+            linked[steam_id] = int(discord_id)
+    return linked
+
+
+def game_label(appid):
+    """
+    Returns a game's name from the app catalog or the local app-details cache, falling back to its appid.
+    """
+    name = app_catalog.get_app_catalog().name(appid)
+    if name:
+        return name
+    game = steam_api_manager.get_cached_game_details(appid)
+    return game.display_name if game else f"App {appid}"
+
+
+def find_games(query, limit):
+    """
+    Returns up to `limit` (appid, name) pairs matching `query`, without contacting Steam.
+    Blocks on the local caches, so call it through asyncio.to_thread from the event loop.
+    """
+    catalog = app_catalog.get_app_catalog()
+    if len(catalog):
+        return catalog.search(query, limit=limit)
+    return cache_manager.get_app_details_cache().search_names(query, limit=limit)
+
+
+async def game_autocomplete(interaction: discord.Interaction, current: str):
+    """
+    Suggests games whose name matches what has been typed so far, from the app catalog when one has been imported
+    and from the local app-details cache otherwise.
+    """
+    matches = await asyncio.to_thread(find_games, current, 25)
+    return [app_commands.Choice(name=name[:100], value=str(appid)) for appid, name in matches]
+
+
+@bot.tree.command(name="who-owns", description="Shows which linked members of this server own a game.")
+@app_commands.describe(game="Game name or Steam appid")
+@app_commands.autocomplete(game=game_autocomplete)
+async def who_owns(interaction: discord.Interaction, game: str):
+    if game.strip().isdigit():
+        appid = int(game.strip())
+    else:
+        matches = await asyncio.to_thread(find_games, game, 1)
+        if not matches:
+            await interaction.response.send_message(f"I don't know a game called **{game}** yet.", ephemeral=True)
+            return
+        appid = matches[0][0]
+
+    linked = await get_linked_steam_ids(interaction.guild_id)
+    owners = [linked[steam_id] for steam_id in cache_manager.get_ownership_index().owners(appid) if steam_id in linked]
+    if not owners:
+        await interaction.response.send_message(
+            f"No linked member of this server owns **{game_label(appid)}** (as far as their cached libraries show)."
+        )
+        return
+    await interaction.response.send_message(
+        f"**{game_label(appid)}** is owned by {len(owners)} linked member(s): "
+        + ", ".join(f"<@{discord_id}>" for discord_id in sorted(owners)),
+        allowed_mentions=discord.AllowedMentions.none()
+    )
+
+
+@bot.tree.command(name="suggest-group", description="Finds the multiplayer games shared by the most online members.")
+async def suggest_group(interaction: discord.Interaction):
+    if interaction.guild is None:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+
+    linked = await get_linked_steam_ids(interaction.guild_id)
+    if bot.intents.presences:
+        online_ids = {member.id for member in interaction.guild.members
+                      if member.status != discord.Status.offline and not member.bot}
+        online_ids.add(interaction.user.id)
+        candidates = {steam_id: discord_id for steam_id, discord_id in linked.items() if discord_id in online_ids}
+        scope = "online linked members"
+    else:
+        candidates = linked
+        scope = "linked members (online status unavailable)"
+
+    index = cache_manager.get_ownership_index()
+    best = index.most_shared(candidates, limit=5, category_index=cache_manager.get_category_index())
+    if not best:
+        await interaction.response.send_message(
+            f"No multiplayer game is shared by at least two {scope} yet. Try /letsplay with specific friends."
+        )
+        return
+
+    lines = [f"🎮 **Best groups among {len(candidates)} {scope}:**"]
+    for rank, (appid, owner_count) in enumerate(best, start=1):
+        owners = sorted(candidates[steam_id] for steam_id in index.owners(appid) if steam_id in candidates)
+        lines.append(f"{rank}. **{game_label(appid)}** ({owner_count} players): "
+                     + ", ".join(f"<@{discord_id}>" for discord_id in owners))
+    message = "\n".join(lines)
+    if len(message) > 1990:
+        message = message[:1990] + "..."
+    await interaction.response.send_message(message, allowed_mentions=discord.AllowedMentions.none())
 
 
 class SteamIDModal(discord.ui.Modal, title="Link Your Steam Account"):
@@ -119,13 +688,16 @@ class SteamIDModal(discord.ui.Modal, title="Link Your Steam Account"):
             )
             return
         
-        success, message = sheets_manager.update_user_steam_id(interaction.user.id, entered_steam_id)
+        success, message = await asyncio.to_thread(
+            member_storage.update_user_steam_id, interaction.user.id, entered_steam_id, interaction.guild_id
+        )
 
         if success:
             await interaction.response.send_message(
                 f"Your SteamID (`{entered_steam_id}`) has been successfully linked to this Discord server.",
                 ephemeral=True
             )
+            cache_warmer.warmer.schedule_member_refresh(entered_steam_id)
         else:
             await interaction.response.send_message(
                 f"Failed to link your SteamID: {message}. Please try again or contact {admin_mention} for assistance.",
@@ -141,7 +713,9 @@ class SteamIDModal(discord.ui.Modal, title="Link Your Steam Account"):
 
 @bot.tree.command(name="link-steam", description="Link your Steam account to this Discord server so you can use the other functions.")
 async def link_steam(interaction: discord.Interaction):
-    current_steam_id = sheets_manager.get_steam_id_for_discord_id(interaction.user.id)
+    current_steam_id = await asyncio.to_thread(
+        member_storage.get_steam_id_for_discord_id, interaction.user.id, interaction.guild_id
+    )
 
     if current_steam_id:
         await interaction.response.send_message(
@@ -153,6 +727,180 @@ async def link_steam(interaction: discord.Interaction):
         await interaction.response.send_modal(SteamIDModal())
 
 
+class PickGameView(discord.ui.View):
+    """
+    Paginated common-games list with buttons to page through it and to pick (and re-roll) a random game.
+    Every button edits the same message, so the whole list costs a single Discord message.
+    """
+
+    def __init__(self, games_list_with_details, *args, weights=None, title="Common multiplayer games", note=None,
+                 leading_embeds=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.games_list_with_details = games_list_with_details
+        self.weights = weights
+        self.title = title
+        self.note = note
+        self.leading_embeds = list(leading_embeds)
+        self.picked_embed = None
+        self.page = 0
+        self.page_count = max(1, -(-len(games_list_with_details) // GAMES_PER_PAGE))
+        self.re_rolls_left = 3
+        self.message = None
+
+        self.previous_button = discord.ui.Button(label="◀", style=discord.ButtonStyle.secondary, disabled=True)
+        self.next_button = discord.ui.Button(label="▶", style=discord.ButtonStyle.secondary,
+                                             disabled=self.page_count == 1)
+        if self.page_count > 1:
+            self.add_item(self.previous_button)
+            self.add_item(self.next_button)
+        self.previous_button.callback = self.previous_page_button
+        self.next_button.callback = self.next_page_button
+
+        self.pick_button = discord.ui.Button(label="Pick a random game for us!", style=discord.ButtonStyle.primary)
+        self.add_item(self.pick_button)
+        self.pick_button.callback = self.pick_first_game_button 
+
+        self.reroll_button = discord.ui.Button(label="Re-roll game", style=discord.ButtonStyle.secondary, disabled=True)
+        self.add_item(self.reroll_button)
+        self.reroll_button.callback = self.reroll_game_button
+
+    def page_embed(self):
+        """
+        Renders the current page of the ranked games list.
+        """
+        start = self.page * GAMES_PER_PAGE
+        lines = [
+            f"{position}. {game.display_name}"
+            for position, game in enumerate(self.games_list_with_details[start:start + GAMES_PER_PAGE], start=start + 1)
+        ]
+        embed = discord.Embed(title=self.title, description="\n".join(lines), color=discord.Color.blurple())
+        footer = f"Page {self.page + 1}/{self.page_count}"
+        if self.note:
+            footer += f" · {self.note}"
+        embed.set_footer(text=footer)
+        return embed
+
+    def render_embeds(self):
+        """
+        Returns every embed of the message: leading status embeds, the current page and the picked game, if any.
+        """
+        embeds = self.leading_embeds + [self.page_embed()]
+        if self.picked_embed is not None:
+            embeds.append(self.picked_embed)
+        return embeds
+
+    def pick_random_game(self):
+        """
+        Picks a game at random, favouring higher-ranked games when ranking weights are available.
+        """
+        if self.weights:
+            return random.choices(self.games_list_with_details, weights=self.weights)[0]
+        return random.choice(self.games_list_with_details)
+
+    def picked_game_embed(self, title, color):
+        random_game_data = self.pick_random_game()
+        embed = discord.Embed(title=title.format(name=random_game_data.display_name), color=color)
+        if random_game_data.header_image:
+            embed.set_image(url=random_game_data.header_image)
+        else:
+            embed.description = "No image available for this game."
+        return embed
+
+    async def show_page(self, interaction: discord.Interaction, page):
+        self.page = min(max(page, 0), self.page_count - 1)
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = self.page == self.page_count - 1
+        await interaction.response.edit_message(embeds=self.render_embeds(), view=self)
+
+    async def previous_page_button(self, interaction: discord.Interaction):
+        await self.show_page(interaction, self.page - 1)
+
+    async def next_page_button(self, interaction: discord.Interaction):
+        await self.show_page(interaction, self.page + 1)
+
+    async def pick_first_game_button(self, interaction: discord.Interaction):
+        if self.games_list_with_details:
+            self.picked_embed = self.picked_game_embed("🎲 Let's play: {name}!", discord.Color.blue())
+            self.pick_button.disabled = True
+            self.reroll_button.disabled = False
+            self.picked_embed.set_footer(text=f"{self.re_rolls_left} re-rolls left.")
+
+            await interaction.response.edit_message(embeds=self.render_embeds(), view=self)
+        else:
+            await interaction.response.send_message("No games available to pick from.", ephemeral=True)
+
+    async def reroll_game_button(self, interaction: discord.Interaction):
+        if self.re_rolls_left > 0 and self.games_list_with_details:
+            self.re_rolls_left -= 1
+            self.picked_embed = self.picked_game_embed("🎲 Re-rolled: {name}!", discord.Color.green())
+
+            if self.re_rolls_left == 0:
+                self.reroll_button.disabled = True
+                self.picked_embed.set_footer(text="No more re-rolls left.")
+            else:
+                self.picked_embed.set_footer(text=f"{self.re_rolls_left} re-rolls left.")
+
+            await interaction.response.edit_message(embeds=self.render_embeds(), view=self)
+        elif self.re_rolls_left == 0:
+            await interaction.response.send_message("You have no re-rolls left for this session.", ephemeral=True)
+            self.reroll_button.disabled = True
+            await interaction.message.edit(view=self)
+        else:
+            await interaction.response.send_message("No games available to re-roll from.", ephemeral=True)
+
+
+    async def on_timeout(self):
+        for item in self.children:
+            if isinstance(item, discord.ui.Button):
+                item.disabled = True
+        if self.message: 
+            try:
+                await self.message.edit(view=self)
+            except discord.NotFound:
+                print("Warning: Message for view timeout not found, possibly deleted.")
+        print("Game picker view timed out.")
+
+
+async def send_common_games(reporter, players, common_multiplayer_games_data, player_count, weights=None,
+                            possibly_stale=False):
+    """
+    Posts the ranked common multiplayer games as a paginated PickGameView, or popular suggestions if there are none.
+    With possibly_stale, the list is marked as built from cached data because Steam was slow or unavailable.
+    """
+    if not common_multiplayer_games_data:
+        await reporter.finish(
+            content="It looks like you don't have any common games among the selected players with public profiles. "
+            "Perhaps try different friends or consider playing a popular multiplayer game!"
+            "\n\nHere are some general suggestions for popular multiplayer games (manual suggestions for now):"
+            "\n- Among Us"
+            "\n- Fall Guys"
+            "\n- Apex Legends"
+            "\n- Valorant"
+            "\n- Fortnite"
+            + ("\n⚠️ Steam was slow or unavailable, so this was worked out from cached data." if possibly_stale else ""),
+            embeds=reporter.closing_embeds()
+        )
+        return
+
+    player_mentions = " ".join([player.mention for player in players])
+    note = "ranked by your group's playtime"
+    if possibly_stale:
+        note += " · ⚠️ built from cached data, may be out of date"
+    view = PickGameView(
+        common_multiplayer_games_data,
+        timeout=300,
+        weights=weights,
+        title=f"Common multiplayer games for {player_count} players ({len(common_multiplayer_games_data)})",
+        note=note,
+        leading_embeds=reporter.closing_embeds(),
+    )
+    view.message = await reporter.finish(
+        content=f"Hey {player_mentions}! 🎉 Here are the multiplayer games you all own:",
+        embeds=view.render_embeds(),
+        view=view,
+    )
+
+
 @bot.tree.command(name="letsplay", description="Finds common games among selected friends.")
 @app_commands.describe(
     player2="First friend to include",
@@ -175,220 +923,79 @@ async def letsplay(interaction: discord.Interaction,
     if player5:
         players.append(player5)
 
-    player_steam_ids = {}
+    deadline = time.monotonic() + query_engine.LETSPLAY_DEADLINE
+    with steam_api_manager.guild_budget(interaction.guild_id):
+        await run_letsplay(interaction, players, deadline)
+
+
+async def run_letsplay(interaction: discord.Interaction, players, deadline):
+    """
+    Finds and posts the multiplayer games shared by `players`, whose Steam IDs are looked up in the interaction's guild.
+    The search itself is done by the query engine; answers built from stale data schedule a cache revalidation.
+    Progress and warnings are coalesced by a ProgressReporter into one status embed.
+    """
+    reporter = ProgressReporter(interaction, "🎮 Finding common games")
+    player_names_by_steam_id = {}
     missing_steam_ids_names = []
     
-    for player in players:
-        steam_id = sheets_manager.get_steam_id_for_discord_id(player.id)
+    steam_ids = await asyncio.gather(
+        *(asyncio.to_thread(member_storage.get_steam_id_for_discord_id, player.id, interaction.guild_id)
+          for player in players)
+    )
+    for player, steam_id in zip(players, steam_ids):
         if steam_id:
-            player_steam_ids[player.id] = steam_id
+            player_names_by_steam_id.setdefault(str(steam_id), player.name)
         else:
             missing_steam_ids_names.append(player.name)
 
     if missing_steam_ids_names:
-        await interaction.followup.send(
+        reporter.warn(
             f"Could not find Steam IDs for: {', '.join(missing_steam_ids_names)}. "
             "Please ensure their Steam IDs are entered in the Google Sheet."
         )
 
-    all_players_game_lists = {}
-    private_profiles_names = []
-
-    for player_id, steam_id in player_steam_ids.items():
-        player_member = discord.utils.get(players, id=player_id)
-        player_display_name = player_member.name if player_member else f"User ID {player_id}"
+    result = await query_engine.get_engine().find_common_games(
+        player_names_by_steam_id, deadline=deadline, progress=reporter.update
+    )
 
-        games = steam_api_manager.get_owned_games(steam_id)
-        
-        if games is None:
-            await interaction.followup.send(
-                f"Failed to fetch games for {player_display_name} (SteamID: `{steam_id}`). "
+    private_profiles_names = []
+    for steam_id, player in result.players.items():
+        if player.status == "failed":
+            reporter.warn(
+                f"Failed to fetch games for {player_names_by_steam_id[steam_id]} (SteamID: `{steam_id}`). "
                 "The Steam API might be down, or there's an issue with the key. "
                 "This player will be excluded from the common games search."
             )
-        elif not games:
-            private_profiles_names.append(player_display_name)
-        else:
-            all_players_game_lists[player_id] = set(games.keys())
-
+        elif player.status == "private":
+            private_profiles_names.append(player_names_by_steam_id[steam_id])
 
     if private_profiles_names:
-        await interaction.followup.send(
+        reporter.warn(
             f"Note: Could not retrieve games for {', '.join(private_profiles_names)} "
             "because their Steam profiles are likely private or have no games. "
             "They will be excluded from the common games search."
         )
 
-    active_players_game_lists = [game_set for game_set in all_players_game_lists.values() if game_set]
-
-    if not active_players_game_lists:
-        await interaction.followup.send(
-            "No players with public Steam profiles or games found to compare."
+    if result.player_count == 0:
+        await reporter.finish(
+            content="No players with public Steam profiles or games found to compare.",
+            embeds=reporter.closing_embeds()
         )
         return
     
-    if len(active_players_game_lists) < 2:
-        await interaction.followup.send(
-            "To find common games, please ensure at least two selected players "
-            "have public Steam profiles with games."
+    if result.player_count < 2:
+        await reporter.finish(
+            content="To find common games, please ensure at least two selected players "
+            "have public Steam profiles with games.",
+            embeds=reporter.closing_embeds()
         )
         return
-    
-    common_game_appids = set.intersection(*active_players_game_lists)
-
-    multiplayer_game_appids = set()
-    total_common_games = len(common_game_appids)
-    processed_count = 0
-    message_sent = False
 
-    if total_common_games > 5:
-        await interaction.followup.send(f"Found {total_common_games} common games. Now checking for multiplayer status (this may take a moment)...")
-        message_sent = True
-
-    for appid in common_game_appids:
-        if steam_api_manager.is_game_multiplayer(appid):
-            multiplayer_game_appids.add(appid)
-        
-        processed_count += 1
-        if total_common_games > 5 and processed_count % 5 == 0:
-            if message_sent:
-                await interaction.edit_original_response(
-                    content=f"Found {total_common_games} common games. Checking for multiplayer status... ({processed_count}/{total_common_games} checked)"
-                )
-            else:
-                await interaction.followup.send(
-                    f"Found {total_common_games} common games. Checking for multiplayer status... ({processed_count}/{total_common_games} checked)"
-                )
-                message_sent = True
-
-    final_common_appids = multiplayer_game_appids
-
-    if not final_common_appids:
-        await interaction.followup.send(
-            "It looks like you don't have any common games among the selected players with public profiles. "
-            "Perhaps try different friends or consider playing a popular multiplayer game!"
-            "\n\nHere are some general suggestions for popular multiplayer games (manual suggestions for now):"
-            "\n- Among Us"
-            "\n- Fall Guys"
-            "\n- Apex Legends"
-            "\n- Valorant"
-            "\n- Fortnite"
-        )
-    else:
-        common_multiplayer_games_data = [] 
-        for appid in final_common_appids:
-            details = steam_api_manager.get_game_details(appid)
-            if details and "name" in details and "header_image" in details:
-                game_name = details["name"]
-                image_url = details["header_image"]
-                common_multiplayer_games_data.append({"name": game_name, "image": image_url})
-            elif details and "name" in details:
-                game_name = details["name"]
-                common_multiplayer_games_data.append({"name": game_name, "image": None})
-            else:
-                common_multiplayer_games_data.append({"name": f"Unknown Game (AppID: {appid})", "image": None})
-
-        common_multiplayer_games_data.sort(key=lambda x: x["name"])
-
-        class PickGameView(discord.ui.View):
-            def __init__(self, games_list_with_details, message_to_edit: discord.Message, *args, **kwargs):
-                super().__init__(*args, **kwargs)
-                self.games_list_with_details = games_list_with_details
-                self.re_rolls_left = 3
-                self.message = message_to_edit
-
-                self.pick_button = discord.ui.Button(label="Pick a random game for us!", style=discord.ButtonStyle.primary)
-                self.add_item(self.pick_button)
-                self.pick_button.callback = self.pick_first_game_button 
-
-                self.reroll_button = discord.ui.Button(label="Re-roll game", style=discord.ButtonStyle.secondary, disabled=True)
-                self.add_item(self.reroll_button)
-                self.reroll_button.callback = self.reroll_game_button
-
-            async def pick_first_game_button(self, interaction: discord.Interaction):
-                if self.games_list_with_details:
-                    random_game_data = random.choice(self.games_list_with_details)
-                    game_name = random_game_data["name"]
-                    game_image_url = random_game_data["image"]
-
-                    embed = discord.Embed(
-                        title=f"🎲 Let's play: {game_name}!",
-                        color=discord.Color.blue()
-                    )
-                    if game_image_url:
-                        embed.set_image(url=game_image_url)
-                    else:
-                        embed.description = "No image available for this game."
-
-                    self.pick_button.disabled = True
-                    self.reroll_button.disabled = False
-                    embed.set_footer(text=f"{self.re_rolls_left} re-rolls left.")
-
-                    await interaction.response.edit_message(
-                        embed=embed,
-                        view=self
-                    )
-                else:
-                    await interaction.response.send_message("No games available to pick from.", ephemeral=True)
-
-            async def reroll_game_button(self, interaction: discord.Interaction):
-                if self.re_rolls_left > 0 and self.games_list_with_details:
-                    self.re_rolls_left -= 1
-                    random_game_data = random.choice(self.games_list_with_details)
-                    game_name = random_game_data["name"]
-                    game_image_url = random_game_data["image"]
-
-                    embed = discord.Embed(
-                        title=f"🎲 Re-rolled: {game_name}!",
-                        color=discord.Color.green()
-                    )
-                    if game_image_url:
-                        embed.set_image(url=game_image_url)
-                    else:
-                        embed.description = "No image available for this game."
-
-                    if self.re_rolls_left == 0:
-                        self.reroll_button.disabled = True
-                        embed.set_footer(text="No more re-rolls left.")
-                    else:
-                        embed.set_footer(text=f"{self.re_rolls_left} re-rolls left.")
-
-                    await interaction.response.edit_message(
-                        embed=embed,
-                        view=self
-                    )
-                elif self.re_rolls_left == 0:
-                    await interaction.response.send_message("You have no re-rolls left for this session.", ephemeral=True)
-                    self.reroll_button.disabled = True
-                    await interaction.message.edit(view=self)
-                else:
-                    await interaction.response.send_message("No games available to re-roll from.", ephemeral=True)
-
-
-            async def on_timeout(self):
-                for item in self.children:
-                    if isinstance(item, discord.ui.Button):
-                        item.disabled = True
-                if self.message: 
-                    try:
-                        await self.message.edit(view=self)
-                    except discord.NotFound:
-                        print("Warning: Message for view timeout not found, possibly deleted.")
-                print("Game picker view timed out.")
-
-
-        game_names_only = [game["name"] for game in common_multiplayer_games_data]
-
-        player_mentions = " ".join([player.mention for player in players])
-        initial_response_message = await interaction.followup.send(
-            f"Hey {player_mentions}! 🎉 **Common MULTIPLAYER games found for {len(active_players_game_lists)} players:**\n" +
-            "\n".join([f"- {name}" for name in game_names_only])
-        )
-        
-        view = PickGameView(common_multiplayer_games_data, initial_response_message, timeout=300)
-        
-        await initial_response_message.edit(view=view)
+    await send_common_games(reporter, players, result.games, result.player_count,
+                            weights=result.weights, possibly_stale=result.possibly_stale)
 
+    if result.stale_steam_ids or result.stale_appids:
+        cache_warmer.warmer.schedule_revalidation(result.stale_steam_ids, result.stale_appids)
 
 if __name__ == "__main__":
     bot.run(TOKEN)
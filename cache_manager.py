@@ -0,0 +1,832 @@
+import argparse
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+import app_catalog
+
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', os.path.join(BOT_DIR, 'steambot_cache.sqlite3'))
+
+APP_DETAILS_TTL = float(os.getenv('APP_DETAILS_TTL', 7 * 24 * 60 * 60))
+APP_DETAILS_NEGATIVE_TTL = float(os.getenv('APP_DETAILS_NEGATIVE_TTL', 24 * 60 * 60))
+APP_DETAILS_MAX_ENTRIES = int(os.getenv('APP_DETAILS_MAX_ENTRIES', 50000))
+
+LIBRARY_CACHE_TTL = float(os.getenv('LIBRARY_CACHE_TTL', 30 * 60))
+LIBRARY_CACHE_MAX_ENTRIES = int(os.getenv('LIBRARY_CACHE_MAX_ENTRIES', 5000))
+
+GROUP_RESULT_CACHE_TTL = float(os.getenv('GROUP_RESULT_CACHE_TTL', LIBRARY_CACHE_TTL))
+GROUP_RESULT_CACHE_MAX_ENTRIES = int(os.getenv('GROUP_RESULT_CACHE_MAX_ENTRIES', 500))
+
+CATEGORY_INDEX_PATH = os.getenv('CATEGORY_INDEX_PATH', os.path.join(BOT_DIR, 'category_index.bin'))
+CATEGORY_INDEX_AUTOSAVE_EVERY = int(os.getenv('CATEGORY_INDEX_AUTOSAVE_EVERY', 200))
+
+# Steam category IDs whose descriptions match "multi-player", "co-op" or "mmo":
+# Multi-player, Co-op, MMO, Cross-Platform Multiplayer, Online Co-op, Shared/Split Screen Co-op, LAN Co-op.
+MULTIPLAYER_CATEGORY_IDS = (1, 9, 20, 27, 38, 39, 48)
+MAX_CATEGORY_ID = 127
+
+_CATEGORY_INDEX_MAGIC = b'SBCI\x01\x00\x00\x00'
+_CATEGORY_INDEX_RECORD = struct.Struct('<IQQ')
+
+
+def _connect(path):
+    """
+    Opens a SQLite connection tuned for a small, frequently read local cache.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class AppDetailsCache:
+    """
+    Persistent SQLite cache of Steam Store appdetails payloads.
+    Successful lookups live for `ttl` seconds, apps the store reports as `success: false`
+    are remembered for `negative_ttl` seconds, and the least recently used rows are evicted
+    once the table grows past `max_entries`.
+    App names are kept in their own indexed column so name searches never parse the JSON payloads.
+    Hits only record their access time in memory; flush() writes the access times and runs eviction in one
+    transaction, so lookups on the event loop never write. The connection is shared with worker threads
+    (name searches, flushes) and guarded by a lock.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, ttl=APP_DETAILS_TTL,
+                 negative_ttl=APP_DETAILS_NEGATIVE_TTL, max_entries=APP_DETAILS_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Callables invoked with an appid whenever that app's cached record changes.
+        self.listeners = []
+        self._lock = threading.RLock()
+        # appid -> time of the last hit not yet written to the database.
+        self._pending_access = {}
+        self._conn = _connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS app_details ("
+            " appid INTEGER PRIMARY KEY,"
+            " success INTEGER NOT NULL,"
+            " data TEXT,"
+            " fetched_at REAL NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " name TEXT)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(app_details)")]
+        if "name" not in columns:
+            # Caches created before the name column existed are backfilled once from the payloads.
+            self._conn.execute("ALTER TABLE app_details ADD COLUMN name TEXT")
+            self._conn.execute("UPDATE app_details SET name = json_extract(data, '$.name') WHERE success = 1")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_app_details_last_access ON app_details (last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_app_details_name ON app_details (name COLLATE NOCASE)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM app_details").fetchone()[0]
+
+    def get(self, appid, allow_stale=False):
+        """
+        Looks up an app in the cache.
+        Returns (True, details) on a fresh hit, where details is None for a cached `success: false` app,
+        or (False, None) on a miss or an expired entry. With allow_stale, expired entries are returned as hits too.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT success, data, fetched_at FROM app_details WHERE appid = ?", (int(appid),)
+            ).fetchone()
+        now = time.time()
+        if row is not None:
+            success, data, fetched_at = row
+            ttl = self.ttl if success else self.negative_ttl
+            if allow_stale or now - fetched_at < ttl:
+                self._pending_access[int(appid)] = now
+                self.hits += 1
+                return True, json.loads(data) if success else None
+        self.misses += 1
+        return False, None
+
+    def contains(self, appid):
+        """
+        Returns True if the app has a fresh entry, without touching the hit/miss counters or access time.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT success, fetched_at FROM app_details WHERE appid = ?", (int(appid),)
+            ).fetchone()
+        if row is None:
+            return False
+        success, fetched_at = row
+        return time.time() - fetched_at < (self.ttl if success else self.negative_ttl)
+
+    def put(self, appid, details):
+        """
+        Stores the appdetails payload for an app. Pass None to record a `success: false` app.
+        The table may grow past `max_entries` until the next flush() evicts the overflow.
+        """
+        now = time.time()
+        data = json.dumps(details, separators=(',', ':')) if details is not None else None
+        name = details.get("name") if details is not None else None
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT success, data FROM app_details WHERE appid = ?", (int(appid),)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO app_details (appid, success, data, fetched_at, last_access, name)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (int(appid), 1 if details is not None else 0, data, now, now, name)
+            )
+            self._conn.commit()
+            if previous is None:
+                self._count += 1
+            self._pending_access.pop(int(appid), None)
+        if previous != (1 if details is not None else 0, data):
+            for listener in self.listeners:
+                listener(int(appid))
+
+    def flush(self):
+        """
+        Writes the access times of recent hits and evicts the least recently used rows past `max_entries`,
+        in one transaction. Blocking; call it from a worker thread when running inside the event loop.
+        """
+        with self._lock:
+            pending, self._pending_access = self._pending_access, {}
+            if pending:
+                self._conn.executemany(
+                    "UPDATE app_details SET last_access = ? WHERE appid = ?",
+                    [(accessed_at, appid) for appid, accessed_at in pending.items()]
+                )
+            overflow = self._count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM app_details WHERE appid IN "
+                    "(SELECT appid FROM app_details ORDER BY last_access ASC LIMIT ?)", (overflow,)
+                )
+                self._count -= overflow
+                self.evictions += overflow
+            if pending or overflow > 0:
+                self._conn.commit()
+
+    def clear(self):
+        """
+        Removes every cached entry.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM app_details")
+            self._conn.commit()
+            self._count = 0
+            self._pending_access = {}
+
+    def stats(self):
+        """
+        Returns a dictionary of hit/miss counters and the current number of cached entries.
+        """
+        size = self._count
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": size,
+        }
+
+    def search_names(self, query, limit=10):
+        """
+        Returns up to `limit` (appid, name) pairs for cached apps whose name contains `query` (case-insensitive),
+        exact matches first, then shorter names. Scans only the name index, not the payloads.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self._lock:
+            return self._conn.execute(
+                "SELECT appid, name FROM app_details INDEXED BY idx_app_details_name"
+                " WHERE name LIKE ? ESCAPE '\\'"
+                " ORDER BY lower(name) = lower(?) DESC, length(name), name LIMIT ?",
+                (pattern, query, limit)
+            ).fetchall()
+
+    def iter_details(self, batch_size=500):
+        """
+        Yields (appid, details) for every successful entry in the cache, including expired ones.
+        Reads `batch_size` rows at a time so the connection is not held while the caller works.
+        """
+        last_appid = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT appid, data FROM app_details WHERE success = 1 AND appid > ? ORDER BY appid LIMIT ?",
+                    (last_appid, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for appid, data in rows:
+                yield appid, json.loads(data)
+            last_appid = rows[-1][0]
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+class LibraryCache:
+    """
+    Cache of owned-game libraries keyed by SteamID, served from memory and written behind to SQLite
+    (unless `path` is None), so a restarted bot or a headless query still has every member's last known library.
+    Each library is stored as a sorted array('I') of appids (4 bytes per game, no names), with two
+    aligned array('I') columns holding total and last-two-weeks playtime in minutes.
+    Changes are queued in memory and written in one transaction by flush().
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, ttl=LIBRARY_CACHE_TTL, max_entries=LIBRARY_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Callables invoked with a SteamID whenever that member's cached games or playtimes change.
+        self.listeners = []
+        self._libraries = {}
+        self._lock = threading.Lock()
+        # steam_id -> row to write, or None to delete it, not yet flushed to the database.
+        self._pending = {}
+        self._conn = None
+        if path is not None:
+            self._conn = _connect(path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS libraries ("
+                " steam_id TEXT PRIMARY KEY,"
+                " appids BLOB NOT NULL,"
+                " playtime_forever BLOB NOT NULL,"
+                " playtime_2weeks BLOB NOT NULL,"
+                " fetched_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+            self._load()
+
+    def _load(self):
+        """
+        Loads the most recently fetched libraries from the database, keeping their age.
+        """
+        rows = self._conn.execute(
+            "SELECT steam_id, appids, playtime_forever, playtime_2weeks, fetched_at FROM libraries"
+            " ORDER BY fetched_at DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        now, monotonic_now = time.time(), time.monotonic()
+        for steam_id, *columns, fetched_at in reversed(rows):
+            library, forever_column, recent_column = (array('I', column) for column in columns)
+            self._libraries[steam_id] = (monotonic_now - (now - fetched_at), library, forever_column, recent_column)
+
+    def get(self, steam_id, allow_stale=False):
+        """
+        Returns the cached sorted appid array for a SteamID, or None on a miss or an expired entry.
+        With allow_stale, an expired library is returned as well.
+        """
+        entry = self._libraries.get(str(steam_id))
+        if entry is not None and (allow_stale or time.monotonic() - entry[0] < self.ttl):
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def get_playtimes(self, steam_id, allow_stale=False):
+        """
+        Returns (appids, playtime_forever, playtime_2weeks) arrays for a cached library, or None.
+        The playtime arrays are aligned with the sorted appid array.
+        Fresh lookups count towards the hit ratio; stale reads (fallbacks and index seeding) do not.
+        """
+        entry = self._libraries.get(str(steam_id))
+        if entry is not None and (allow_stale or time.monotonic() - entry[0] < self.ttl):
+            if not allow_stale:
+                self.hits += 1
+            return entry[1], entry[2], entry[3]
+        if not allow_stale:
+            self.misses += 1
+        return None
+
+    def put(self, steam_id, appids, playtime_forever=None, playtime_2weeks=None):
+        """
+        Stores a library and returns the sorted appid array that was cached.
+        `appids` is any iterable of appids; the optional playtime sequences (minutes) are aligned with it.
+        """
+        appids = list(appids)
+        playtime_forever = list(playtime_forever) if playtime_forever is not None else [0] * len(appids)
+        playtime_2weeks = list(playtime_2weeks) if playtime_2weeks is not None else [0] * len(appids)
+        rows = sorted({appid: (forever, recent) for appid, forever, recent
+                       in zip(appids, playtime_forever, playtime_2weeks)}.items())
+        library = array('I', (appid for appid, _ in rows))
+        forever_column = array('I', (playtimes[0] for _, playtimes in rows))
+        recent_column = array('I', (playtimes[1] for _, playtimes in rows))
+        previous = self._libraries.pop(str(steam_id), None)
+        self._libraries[str(steam_id)] = (time.monotonic(), library, forever_column, recent_column)
+        if self._conn is not None:
+            self._pending[str(steam_id)] = (library, forever_column, recent_column, time.time())
+        if len(self._libraries) > self.max_entries:
+            oldest_steam_id = next(iter(self._libraries))
+            del self._libraries[oldest_steam_id]
+            if self._conn is not None:
+                self._pending[oldest_steam_id] = None
+        # Playtimes drive the ranking, so a playtime-only refresh is a change too.
+        if previous is None or previous[1:] != (library, forever_column, recent_column):
+            for listener in self.listeners:
+                listener(str(steam_id))
+        return library
+
+    def invalidate(self, steam_id):
+        self._libraries.pop(str(steam_id), None)
+        if self._conn is not None:
+            self._pending[str(steam_id)] = None
+
+    def flush(self):
+        """
+        Writes queued library changes to the database in one transaction.
+        Blocking; call it from a worker thread when running inside the event loop.
+        """
+        if self._conn is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO libraries (steam_id, appids, playtime_forever, playtime_2weeks, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(steam_id, row[0].tobytes(), row[1].tobytes(), row[2].tobytes(), row[3])
+                 for steam_id, row in pending.items() if row is not None]
+            )
+            self._conn.executemany(
+                "DELETE FROM libraries WHERE steam_id = ?",
+                [(steam_id,) for steam_id, row in pending.items() if row is None]
+            )
+            self._conn.commit()
+
+    def libraries(self, allow_stale=False):
+        """
+        Returns {steam_id: appid array} for every library that has not expired.
+        With allow_stale, expired libraries (e.g. loaded from disk after a restart) are included as well.
+        """
+        now = time.monotonic()
+        return {
+            steam_id: entry[1] for steam_id, entry in list(self._libraries.items())
+            if allow_stale or now - entry[0] < self.ttl
+        }
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._libraries),
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+
+class GroupResultCache:
+    """
+    Memoizes the final /letsplay result for a group, keyed by the frozenset of its SteamIDs.
+    An entry is dropped when it expires, when any member's cached library changes, or when the cached
+    details of any app it was computed from change.
+    """
+
+    def __init__(self, ttl=GROUP_RESULT_CACHE_TTL, max_entries=GROUP_RESULT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._results = {}
+        self._keys_by_steam_id = defaultdict(set)
+        self._keys_by_appid = defaultdict(set)
+
+    def get(self, steam_ids):
+        """
+        Returns the cached result for a group, or None on a miss or an expired entry.
+        """
+        key = frozenset(str(steam_id) for steam_id in steam_ids)
+        entry = self._results.get(key)
+        if entry is not None:
+            stored_at, result, _ = entry
+            if time.monotonic() - stored_at < self.ttl:
+                self.hits += 1
+                return result
+            self._drop(key)
+        self.misses += 1
+        return None
+
+    def put(self, steam_ids, result, appids):
+        """
+        Caches `result` for a group. `appids` are the apps whose details the result depends on.
+        """
+        key = frozenset(str(steam_id) for steam_id in steam_ids)
+        self._drop(key)
+        dependencies = frozenset(int(appid) for appid in appids)
+        self._results[key] = (time.monotonic(), result, dependencies)
+        for steam_id in key:
+            self._keys_by_steam_id[steam_id].add(key)
+        for appid in dependencies:
+            self._keys_by_appid[appid].add(key)
+        if len(self._results) > self.max_entries:
+            self._drop(next(iter(self._results)))
+
+    def _drop(self, key):
+        entry = self._results.pop(key, None)
+        if entry is None:
+            return
+        for steam_id in key:
+            keys = self._keys_by_steam_id.get(steam_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_steam_id[steam_id]
+        for appid in entry[2]:
+            keys = self._keys_by_appid.get(appid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_appid[appid]
+
+    def invalidate_steam_id(self, steam_id):
+        for key in list(self._keys_by_steam_id.get(str(steam_id), ())):
+            self._drop(key)
+            self.invalidations += 1
+
+    def invalidate_appid(self, appid):
+        for key in list(self._keys_by_appid.get(int(appid), ())):
+            self._drop(key)
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self._results),
+        }
+
+
+def intersect_sorted_appids(libraries):
+    """
+    Intersects any number of sorted appid arrays and returns the common appids as a sorted array('I').
+    Works from the smallest library outwards and binary-searches the larger ones, so the cost is
+    roughly O(smallest * players * log(largest)) rather than building a set per player.
+    """
+    libraries = sorted(libraries, key=len)
+    if not libraries:
+        return array('I')
+
+    common = libraries[0]
+    for library in libraries[1:]:
+        matched = array('I')
+        lo = 0
+        size = len(library)
+        for appid in common:
+            lo = bisect_left(library, appid, lo)
+            if lo == size:
+                break
+            if library[lo] == appid:
+                matched.append(appid)
+        common = matched
+        if not common:
+            break
+    return array('I', common)
+
+
+def category_mask(category_ids):
+    """
+    Packs Steam category IDs into an integer bitmask (bit n set for category n).
+    """
+    mask = 0
+    for category_id in category_ids:
+        if 0 <= category_id <= MAX_CATEGORY_ID:
+            mask |= 1 << category_id
+    return mask
+
+
+MULTIPLAYER_CATEGORY_MASK = category_mask(MULTIPLAYER_CATEGORY_IDS)
+
+
+def category_mask_from_details(details):
+    """
+    Returns the category bitmask for an appdetails payload, or for a slim cached record that already carries one.
+    """
+    if "category_mask" in details:
+        return details["category_mask"]
+    return category_mask(
+        category["id"] for category in details.get("categories", []) if isinstance(category.get("id"), int)
+    )
+
+
+class CategoryIndex:
+    """
+    Maps appid to a bitmask of Steam category IDs.
+    Filled incrementally as appdetails are fetched and persisted to a compact binary file:
+    an 8-byte header followed by sorted (appid: uint32, mask: 2 x uint64) records.
+    """
+
+    def __init__(self, path=CATEGORY_INDEX_PATH, autosave_every=CATEGORY_INDEX_AUTOSAVE_EVERY):
+        self.path = path
+        self.autosave_every = autosave_every
+        self._masks = {}
+        self._dirty = 0
+        self.load()
+
+    def load(self):
+        """
+        Loads the index file (memory-mapped) if it exists.
+        """
+        if not os.path.exists(self.path) or os.path.getsize(self.path) <= len(_CATEGORY_INDEX_MAGIC):
+            return
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(_CATEGORY_INDEX_MAGIC)] != _CATEGORY_INDEX_MAGIC:
+                print(f"[Cache Manager] Warning: '{self.path}' is not a category index file; ignoring it.")
+                return
+            body = memoryview(mapped)[len(_CATEGORY_INDEX_MAGIC):]
+            usable = len(body) - len(body) % _CATEGORY_INDEX_RECORD.size
+            self._masks = {
+                appid: low | (high << 64)
+                for appid, low, high in _CATEGORY_INDEX_RECORD.iter_unpack(body[:usable])
+            }
+            body.release()
+        print(f"[Cache Manager] Category index loaded with {len(self._masks)} app(s).")
+
+    def save(self):
+        """
+        Atomically rewrites the index file.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_CATEGORY_INDEX_MAGIC)
+            for appid in sorted(self._masks):
+                mask = self._masks[appid]
+                f.write(_CATEGORY_INDEX_RECORD.pack(appid, mask & 0xFFFFFFFFFFFFFFFF, mask >> 64))
+        os.replace(tmp_path, self.path)
+        self._dirty = 0
+
+    def save_if_dirty(self):
+        if self._dirty:
+            self.save()
+
+    def get(self, appid):
+        """
+        Returns the category bitmask for an app, or None if the app has not been indexed.
+        """
+        return self._masks.get(int(appid))
+
+    def update(self, appid, details):
+        """
+        Indexes the categories from an appdetails payload, saving to disk every `autosave_every` changes.
+        """
+        self.update_mask(appid, category_mask_from_details(details))
+
+    def update_mask(self, appid, mask):
+        """
+        Indexes an already computed category bitmask for an app.
+        """
+        if self._masks.get(int(appid)) != mask:
+            self._masks[int(appid)] = mask
+            self._dirty += 1
+            if self._dirty >= self.autosave_every:
+                self.save()
+
+    def partition_multiplayer(self, appids, mask=MULTIPLAYER_CATEGORY_MASK):
+        """
+        Splits appids into (matching, unknown): apps whose indexed categories intersect `mask`,
+        and apps that are not in the index yet. Indexed apps without a matching category are dropped.
+        """
+        masks = self._masks
+        matching = [appid for appid in appids if masks.get(appid, 0) & mask]
+        unknown = [appid for appid in appids if appid not in masks]
+        return matching, unknown
+
+    def __len__(self):
+        return len(self._masks)
+
+
+class OwnershipIndex:
+    """
+    In-memory inverted index from appid to the SteamIDs whose cached library contains it.
+    Kept current by a LibraryCache listener, so queries never contact Steam. Libraries stay indexed after
+    they expire from the library cache; owned games rarely disappear.
+    """
+
+    def __init__(self):
+        self._owners = defaultdict(set)
+        self._libraries = {}
+
+    def update(self, steam_id, library):
+        """
+        Replaces a member's indexed library, touching only the appids that were added or removed.
+        """
+        steam_id = str(steam_id)
+        previous = set(self._libraries.get(steam_id, ()))
+        current = set(library or ())
+        for appid in previous - current:
+            owners = self._owners.get(appid)
+            if owners is not None:
+                owners.discard(steam_id)
+                if not owners:
+                    del self._owners[appid]
+        for appid in current - previous:
+            self._owners[appid].add(steam_id)
+        self._libraries[steam_id] = library if library is not None else array('I')
+
+    def remove(self, steam_id):
+        self.update(steam_id, None)
+        self._libraries.pop(str(steam_id), None)
+
+    def owners(self, appid):
+        """
+        Returns the frozenset of indexed SteamIDs owning an app.
+        """
+        return frozenset(self._owners.get(int(appid), ()))
+
+    def most_shared(self, steam_ids, min_owners=2, limit=10, category_index=None, mask=MULTIPLAYER_CATEGORY_MASK):
+        """
+        Returns up to `limit` (appid, owner_count) pairs for the apps owned by the most of `steam_ids`,
+        skipping apps owned by fewer than `min_owners`. With a category index, only apps whose known
+        categories match `mask` (multiplayer by default) are considered.
+        """
+        counts = Counter()
+        for steam_id in set(map(str, steam_ids)):
+            library = self._libraries.get(steam_id)
+            if library:
+                counts.update(library)
+        results = []
+        for appid, owner_count in counts.most_common():
+            if owner_count < min_owners:
+                break
+            if category_index is not None and not (category_index.get(appid) or 0) & mask:
+                continue
+            results.append((appid, owner_count))
+            if len(results) >= limit:
+                break
+        return results
+
+    def stats(self):
+        return {"members": len(self._libraries), "apps": len(self._owners)}
+
+
+_app_details_cache = None
+_library_cache = None
+_category_index = None
+_group_result_cache = None
+_ownership_index = None
+
+
+def get_app_details_cache():
+    """
+    Returns the process-wide AppDetailsCache, opening the database on first use.
+    """
+    global _app_details_cache
+    if _app_details_cache is None:
+        _app_details_cache = AppDetailsCache()
+    return _app_details_cache
+
+
+def get_library_cache():
+    """
+    Returns the process-wide LibraryCache, loading the persisted libraries on first use.
+    """
+    global _library_cache
+    if _library_cache is None:
+        _library_cache = LibraryCache()
+    return _library_cache
+
+
+def get_category_index():
+    """
+    Returns the process-wide CategoryIndex, loading it from disk on first use.
+    """
+    global _category_index
+    if _category_index is None:
+        _category_index = CategoryIndex()
+    return _category_index
+
+
+def get_group_result_cache():
+    """
+    Returns the process-wide GroupResultCache, subscribed to library and app-details changes.
+    """
+    global _group_result_cache
+    if _group_result_cache is None:
+        _group_result_cache = GroupResultCache()
+        get_library_cache().listeners.append(_group_result_cache.invalidate_steam_id)
+        get_app_details_cache().listeners.append(_group_result_cache.invalidate_appid)
+    return _group_result_cache
+
+
+def get_ownership_index():
+    """
+    Returns the process-wide OwnershipIndex, seeded from the library cache and subscribed to its changes.
+    """
+    global _ownership_index
+    if _ownership_index is None:
+        library_cache = get_library_cache()
+        index = OwnershipIndex()
+        # Stale libraries count too: after a restart every persisted library is older than the TTL.
+        for steam_id, library in library_cache.libraries(allow_stale=True).items():
+            index.update(steam_id, library)
+
+        def on_library_changed(steam_id):
+            playtimes = library_cache.get_playtimes(steam_id, allow_stale=True)
+            index.update(steam_id, playtimes[0] if playtimes else None)
+
+        library_cache.listeners.append(on_library_changed)
+        _ownership_index = index
+    return _ownership_index
+
+
+def flush_caches():
+    """
+    Writes the app-details cache's recent access times and evictions and the library cache's queued changes.
+    Blocking; call it from a worker thread when running inside the event loop.
+    """
+    if _app_details_cache is not None:
+        _app_details_cache.flush()
+    if _library_cache is not None:
+        _library_cache.flush()
+
+
+def load_local_caches():
+    """
+    Opens the app-details cache database and maps the category index, so the first command does not pay for it.
+    Blocking; call it from a worker thread when running inside the event loop.
+    """
+    get_app_details_cache()
+    get_library_cache()
+    get_category_index()
+    get_ownership_index()
+    app_catalog.get_app_catalog()
+
+
+def build_category_index(rebuild=False):
+    """
+    Builds or refreshes the category index from every appdetails payload in the local cache.
+    Returns the number of apps in the index.
+    """
+    index = get_category_index()
+    if rebuild:
+        index._masks = {}
+    for appid, details in get_app_details_cache().iter_details():
+        index.update(appid, details)
+    index.save()
+    return len(index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SteamBot cache maintenance.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser(
+        "build-category-index", help="Build or refresh the multiplayer category index from cached appdetails."
+    )
+    index_parser.add_argument("--rebuild", action="store_true", help="Discard the existing index first.")
+
+    catalog_parser = subparsers.add_parser(
+        "import-app-catalog", help="Build the local app catalog from a Steam app-list JSON dump."
+    )
+    catalog_parser.add_argument("dump", help="Path to the GetAppList JSON dump.")
+
+    search_parser = subparsers.add_parser("search-app-catalog", help="Search the local app catalog by name.")
+    search_parser.add_argument("query")
+
+    args = parser.parse_args()
+    if args.command == "build-category-index":
+        count = build_category_index(rebuild=args.rebuild)
+        print(f"Category index at '{CATEGORY_INDEX_PATH}' now holds {count} app(s).")
+    elif args.command == "import-app-catalog":
+        count = app_catalog.import_app_list_dump(args.dump)
+        print(f"App catalog at '{app_catalog.APP_CATALOG_PATH}' now holds {count} app(s).")
+    elif args.command == "search-app-catalog":
+        catalog = app_catalog.get_app_catalog()
+        start = time.perf_counter()
+        matches = catalog.search(args.query)
+        elapsed = time.perf_counter() - start
+        for appid, name in matches:
+            print(f"{appid:>10}  {name}")
+        print(f"{len(matches)} match(es) in {elapsed * 1000:.3f} ms.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+from collections import Counter
+
+import cache_manager
+import member_storage
+import steam_api_manager
+
+
+WARMER_INTERVAL_MINUTES = float(os.getenv('WARMER_INTERVAL_MINUTES', 30))
+WARMER_REQUESTS_PER_MINUTE = float(os.getenv('WARMER_REQUESTS_PER_MINUTE', 30))
+WARMER_TOP_SHARED_GAMES = int(os.getenv('WARMER_TOP_SHARED_GAMES', 200))
+WARMER_YIELD_DELAY = 1.0
+
+
+class CacheWarmer:
+    """
+    Pre-fetches owned-game libraries for linked members and app details for the games they share most,
+    so /letsplay starts from warm caches.
+    Every request is charged against its own requests-per-minute budget, and the warmer backs off while
+    interactive commands are queued on the shared Steam rate limiters.
+    """
+
+    def __init__(self, requests_per_minute=WARMER_REQUESTS_PER_MINUTE, top_shared_games=WARMER_TOP_SHARED_GAMES):
+        self.budget = steam_api_manager.RateLimiter("warmer", requests_per_minute / 60, 1)
+        self.top_shared_games = top_shared_games
+        self.libraries_refreshed = 0
+        self.app_details_resolved = 0
+        self.last_run_seconds = None
+        self.revalidations = 0
+        self._pending = set()
+
+    async def _spend(self, endpoint):
+        await self.budget.acquire()
+        limiter = steam_api_manager.get_client().rate_limiters[endpoint]
+        while limiter.busy():
+            await asyncio.sleep(WARMER_YIELD_DELAY)
+
+    async def refresh_library(self, steam_id):
+        """
+        Re-fetches one member's library into the library cache. Returns the appid array, or None on error.
+        """
+        await self._spend("web")
+        library = await steam_api_manager.get_owned_appids(steam_id, refresh=True)
+        if library is not None:
+            self.libraries_refreshed += 1
+        return library
+
+    async def resolve_shared_games(self, libraries, focus=None):
+        """
+        Pre-resolves app details for the games owned by the most members across `libraries`.
+        If `focus` is given, only games in that library are considered.
+        """
+        ownership = Counter()
+        for library in libraries:
+            ownership.update(library)
+        if focus is not None:
+            ownership = Counter({appid: ownership[appid] for appid in focus})
+        app_cache = cache_manager.get_app_details_cache()
+        for appid, owners in ownership.most_common(self.top_shared_games):
+            if owners < 2:
+                break
+            if app_cache.contains(appid):
+                continue
+            await self._spend("store")
+            await steam_api_manager.get_game_details(appid)
+            self.app_details_resolved += 1
+
+    async def run_once(self, guild_ids=(None,)):
+        """
+        Refreshes every linked member's library in the given guilds, then warms app details for their most shared games.
+        Members linked in several guilds are only fetched once.
+        """
+        start = time.monotonic()
+        steam_ids = set()
+        for guild_id in guild_ids:
+            members = await asyncio.to_thread(member_storage.get_all_members_data, guild_id)
+            steam_ids.update(str(member.get("Steam ID", "")).strip() for member in members)
+        steam_ids.discard("")
+
+        libraries = []
+        for steam_id in steam_ids:
+            library = await self.refresh_library(steam_id)
+            if library:
+                libraries.append(library)
+
+        await self.resolve_shared_games(libraries)
+        self.last_run_seconds = time.monotonic() - start
+        print(f"[Cache Warmer] Warmed {len(libraries)} libraries in {self.last_run_seconds:.1f}s "
+              f"({self.app_details_resolved} app detail lookups so far).")
+
+    async def warm_member(self, steam_id):
+        """
+        Refreshes one member's library and warms the games they share with other cached libraries.
+        """
+        library = await self.refresh_library(steam_id)
+        if not library:
+            return
+        libraries = cache_manager.get_library_cache().libraries().values()
+        await self.resolve_shared_games(libraries, focus=library)
+
+    async def revalidate(self, steam_ids=(), appids=()):
+        """
+        Re-fetches libraries and app details that a command had to answer from stale cache entries.
+        Waits until the Steam circuit breakers allow a trial request before starting.
+        """
+        client = steam_api_manager.get_client()
+        await asyncio.sleep(max(breaker.retry_in() for breaker in client.circuit_breakers.values()))
+        for steam_id in steam_ids:
+            await self.refresh_library(steam_id)
+        app_cache = cache_manager.get_app_details_cache()
+        for appid in appids:
+            if app_cache.contains(appid):
+                continue
+            await self._spend("store")
+            await steam_api_manager.get_game_details(appid)
+            self.app_details_resolved += 1
+        self.revalidations += 1
+
+    def _schedule(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    def schedule_member_refresh(self, steam_id):
+        """
+        Starts warm_member() in the background, e.g. right after someone links their Steam account.
+        """
+        return self._schedule(self.warm_member(steam_id))
+
+    def schedule_revalidation(self, steam_ids=(), appids=()):
+        """
+        Starts revalidate() in the background, after a command has answered from stale data.
+        """
+        return self._schedule(self.revalidate(list(steam_ids), list(appids)))
+
+    def stats(self):
+        return {
+            "libraries_refreshed": self.libraries_refreshed,
+            "app_details_resolved": self.app_details_resolved,
+            "last_run_seconds": self.last_run_seconds,
+            "revalidations": self.revalidations,
+            "budget_wait_time": self.budget.total_wait_time,
+        }
+
+
+warmer = CacheWarmer()
@@ -0,0 +1,41 @@
+"""
+In-memory Google Sheets fakes shared by the benchmark and the tests, so neither needs gspread credentials.
+"""
+import time
+from collections import Counter
+
+
+class FakeWorksheet:
+    """
+    In-memory stand-in for a gspread Worksheet with the Username / Discord ID / Steam ID layout.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.rows = [["Username", "Discord ID", "Steam ID"]]
+        self.calls = Counter()
+
+    def _call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_all_values(self):
+        self._call("get_all_values")
+        return [list(row) for row in self.rows]
+
+    def get_all_records(self):
+        self._call("get_all_records")
+        header = self.rows[0]
+        return [dict(zip(header, row)) for row in self.rows[1:]]
+
+    def append_rows(self, rows, value_input_option=None):
+        self._call("append_rows")
+        start = len(self.rows) + 1
+        self.rows.extend(list(row) for row in rows)
+        return {"updates": {"updatedRange": f"Sheet1!A{start}:C{len(self.rows)}"}}
+
+    def batch_update(self, data, value_input_option=None):
+        self._call("batch_update")
+        for update in data:
+            self.rows[int(update["range"][1:]) - 1][2] = update["values"][0][0]
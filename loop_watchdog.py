@@ -0,0 +1,205 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+import metrics
+
+
+LOOP_WATCHDOG_ENABLED = os.getenv('LOOP_WATCHDOG_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Seconds between two event-loop heartbeats; each one measures how late the loop woke it up.
+LOOP_WATCHDOG_INTERVAL = float(os.getenv('LOOP_WATCHDOG_INTERVAL', 0.1))
+# Lag, in seconds, above which the loop counts as blocked and the blocking stack is captured.
+LOOP_LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', 0.25))
+# Number of recent stalls kept in the rolling report.
+LOOP_LAG_REPORT_SIZE = int(os.getenv('LOOP_LAG_REPORT_SIZE', 50))
+STACK_DEPTH = 12
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stall:
+    """
+    One episode of the event loop being blocked for longer than the lag threshold.
+    """
+
+    def __init__(self, started_at, lag, owner, site, stack):
+        self.started_at = started_at
+        self.lag = lag
+        self.owner = owner
+        self.site = site
+        self.stack = stack
+
+
+class LoopWatchdog:
+    """
+    Measures event-loop scheduling lag continuously and pinpoints what blocked the loop.
+
+    A heartbeat coroutine sleeps for `interval` and records how late it woke up. A daemon sampler thread checks
+    the heartbeat; once the loop has missed it by more than `threshold`, the sampler captures the stack of the
+    loop thread while it is still blocked, and attributes it to the running task's label (the slash command or
+    background loop) and to the innermost bot frame, i.e. the call that blocked. Stalls go into a rolling report.
+    Costs one short sleep per interval on the loop and one stack capture per stall.
+    """
+
+    def __init__(self, interval=LOOP_WATCHDOG_INTERVAL, threshold=LOOP_LAG_THRESHOLD, report_size=LOOP_LAG_REPORT_SIZE):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = deque(maxlen=report_size)
+        self.site_counts = Counter()
+        self.site_lag = Counter()
+        self.site_max_lag = {}
+        self.site_owners = {}
+        self.stall_count = 0
+        self.lag = metrics.Histogram()
+        self._task_labels = {}
+        self._loop = None
+        self._loop_thread_id = None
+        self._heartbeat_task = None
+        self._sampler = None
+        self._stopped = threading.Event()
+        self._beat = 0
+        self._beat_due = 0.0
+        self._capture = None
+
+    def start(self):
+        """
+        Starts the heartbeat on the running event loop and the sampler thread. Does nothing if already running.
+        """
+        if self._heartbeat_task is not None and not self._heartbeat_task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._beat_due = time.monotonic() + self.interval
+        self._heartbeat_task = self._loop.create_task(self._heartbeat(), name="loop-watchdog heartbeat")
+        self._sampler = threading.Thread(target=self._sample, name="loop-watchdog sampler", daemon=True)
+        self._sampler.start()
+        print(f"[Loop Watchdog] Watching event-loop lag (threshold {self.threshold * 1000:.0f} ms).")
+
+    def stop(self):
+        self._stopped.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    def label_current_task(self, label):
+        """
+        Names the running task (e.g. "command:letsplay") so stalls it causes are attributed to it.
+        The label is dropped when the task finishes.
+        """
+        task = asyncio.current_task()
+        if task is None:
+            return
+        self._task_labels[task] = label
+        task.add_done_callback(self._task_labels.pop)
+
+    async def _heartbeat(self):
+        while True:
+            self._beat_due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._beat_due)
+            self._beat += 1
+            self.lag.observe(lag)
+            if lag >= self.threshold:
+                self._record_stall(lag)
+
+    def _owner(self, task):
+        if task is None:
+            return "event loop callback"
+        return self._task_labels.get(task) or task.get_name()
+
+    def _sample(self):
+        # Checks twice per threshold, so any stall longer than the threshold is seen while it is happening.
+        period = max(0.01, self.threshold / 2)
+        while not self._stopped.wait(period):
+            beat = self._beat
+            if time.monotonic() - self._beat_due < self.threshold:
+                continue
+            if self._capture is not None and self._capture[0] == beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            owner = self._owner(asyncio.current_task(self._loop))
+            stack = traceback.extract_stack(frame)[-STACK_DEPTH:]
+            del frame
+            self._capture = (beat, owner, stack)
+
+    def _record_stall(self, lag):
+        capture, self._capture = self._capture, None
+        if capture is not None and capture[0] == self._beat - 1:
+            _, owner, stack = capture
+            site = _blocking_site(stack)
+        else:
+            # Too short for the sampler to catch in the act; only its length is known.
+            owner, site, stack = "unknown", "not sampled", []
+        stall = Stall(time.time() - lag, lag, owner, site, stack)
+        self.stalls.append(stall)
+        self.stall_count += 1
+        self.site_counts[site] += 1
+        self.site_lag[site] += lag
+        self.site_max_lag[site] = max(self.site_max_lag.get(site, 0.0), lag)
+        self.site_owners.setdefault(site, Counter())[owner] += 1
+        metrics.registry.observe("event_loop", "stall", lag)
+        print(f"[Loop Watchdog] Event loop blocked for {lag * 1000:.0f} ms by {owner} at {site}")
+
+    def stats(self):
+        return {
+            "samples": self.lag.count,
+            "p50_lag": self.lag.quantile(0.5),
+            "p95_lag": self.lag.quantile(0.95),
+            "max_lag": self.lag.max,
+            "stalls": self.stall_count,
+        }
+
+    def format_report(self, recent=10):
+        """
+        Returns the rolling report as plain text: lag summary, the blocking sites that cost the most, and the
+        stacks of the most recent stalls.
+        """
+        stats = self.stats()
+        lines = [
+            f"Event loop lag: {stats['samples']} samples, p50 {stats['p50_lag'] * 1000:.1f} ms, "
+            f"p95 {stats['p95_lag'] * 1000:.1f} ms, max {stats['max_lag'] * 1000:.0f} ms; "
+            f"{stats['stalls']} stall(s) over {self.threshold * 1000:.0f} ms",
+        ]
+        if self.site_counts:
+            lines.append("")
+            lines.append("Blocking sites by total lag:")
+            for site, total in self.site_lag.most_common(10):
+                owners = ", ".join(f"{owner} x{count}" for owner, count in self.site_owners[site].most_common(3))
+                lines.append(f"  {total:7.2f}s total, {self.site_counts[site]:>4}x, "
+                             f"max {self.site_max_lag[site] * 1000:6.0f} ms  {site}  [{owners}]")
+        if self.stalls:
+            lines.append("")
+            lines.append(f"Most recent stalls (last {min(recent, len(self.stalls))} of {len(self.stalls)} kept):")
+            for stall in list(self.stalls)[-recent:][::-1]:
+                started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stall.started_at))
+                lines.append(f"- {started}  {stall.lag * 1000:.0f} ms  {stall.owner}  at {stall.site}")
+                lines.extend(f"    {line}" for line in _format_stack(stall.stack))
+        return "\n".join(lines)
+
+
+def _blocking_site(stack):
+    """
+    Returns "file:line in function" for the innermost frame of the bot's own code, which made the blocking call,
+    or for the innermost frame if none of the stack is the bot's.
+    """
+    for frame in reversed(stack):
+        if os.path.dirname(os.path.abspath(frame.filename)) == BOT_DIR:
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+    if stack:
+        frame = stack[-1]
+        return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+def _format_stack(stack):
+    return [f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}" for frame in stack]
+
+
+watchdog = LoopWatchdog()
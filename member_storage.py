@@ -0,0 +1,449 @@
+import os
+import sqlite3
+import threading
+import time
+
+import sheets_manager
+
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+MEMBER_STORAGE_BACKEND = os.getenv('MEMBER_STORAGE_BACKEND', 'sqlite').lower()
+MEMBER_DB_PATH = os.getenv('MEMBER_DB_PATH', os.path.join(BOT_DIR, 'members.sqlite3'))
+# Directory holding one SQLite member database per guild (members-<guild_id>.sqlite3).
+MEMBER_DB_DIR = os.getenv('MEMBER_DB_DIR', BOT_DIR)
+MEMBER_MIRROR_INTERVAL = float(os.getenv('MEMBER_MIRROR_INTERVAL', 60))
+# Guilds whose worksheets are read per mirror pass, in rotation, so a pass stays within the Sheets read quota
+# however many guilds the bot is in.
+MEMBER_MIRROR_MAX_READS = int(os.getenv('MEMBER_MIRROR_MAX_READS', 10))
+
+
+class MemberStore:
+    """
+    Interface for member storage backends.
+    Records are returned as dictionaries with the sheet's column names: 'Username', 'Discord ID', 'Steam ID'.
+    Each store holds the members of one guild (guild_id None is the legacy, guild-less store).
+    """
+
+    guild_id = None
+
+    def get_member(self, discord_id):
+        raise NotImplementedError
+
+    def get_steam_id_for_discord_id(self, discord_id):
+        raise NotImplementedError
+
+    def update_user_steam_id(self, discord_id, new_steam_id):
+        raise NotImplementedError
+
+    def add_new_discord_user(self, username, discord_id):
+        raise NotImplementedError
+
+    def add_new_discord_users(self, members):
+        raise NotImplementedError
+
+    def get_member_ids(self):
+        raise NotImplementedError
+
+    def get_all_members_data(self):
+        raise NotImplementedError
+
+
+class SheetsMemberStore(MemberStore):
+    """
+    Backend that reads and writes the guild's worksheet directly through sheets_manager.
+    """
+
+    def __init__(self, guild_id=None):
+        self.guild_id = guild_id
+
+    def get_member(self, discord_id):
+        directory = sheets_manager.get_member_directory_snapshot(guild_id=self.guild_id)
+        entry = (directory or {}).get(str(discord_id))
+        if entry is None:
+            return None
+        return {"Username": entry["username"], "Discord ID": str(discord_id), "Steam ID": entry["steam_id"] or ""}
+
+    def get_steam_id_for_discord_id(self, discord_id):
+        return sheets_manager.get_steam_id_for_discord_id(discord_id, guild_id=self.guild_id)
+
+    def update_user_steam_id(self, discord_id, new_steam_id):
+        return sheets_manager.update_user_steam_id(discord_id, new_steam_id, guild_id=self.guild_id)
+
+    def add_new_discord_user(self, username, discord_id):
+        return sheets_manager.add_new_discord_user(username, discord_id, guild_id=self.guild_id)
+
+    def add_new_discord_users(self, members):
+        return sheets_manager.add_new_discord_users(members, guild_id=self.guild_id)
+
+    def get_member_ids(self):
+        return sheets_manager.get_member_ids(guild_id=self.guild_id)
+
+    def get_all_members_data(self):
+        return sheets_manager.get_all_members_data(guild_id=self.guild_id)
+
+
+class SqliteMemberStore(MemberStore):
+    """
+    Local SQLite backend with indexed lookups by Discord ID and Steam ID.
+    Rows changed locally are flagged `dirty` until the Sheets mirror confirms it has written them, so a restart
+    before a queued sheet write lands never lets the sheet's older data overwrite them.
+    """
+
+    def __init__(self, path=MEMBER_DB_PATH, guild_id=None):
+        self.path = path
+        self.guild_id = guild_id
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS members ("
+            " discord_id TEXT PRIMARY KEY,"
+            " username TEXT NOT NULL,"
+            " steam_id TEXT,"
+            " updated_at REAL NOT NULL,"
+            " dirty INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_members_steam_id ON members (steam_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_members_dirty ON members (dirty) WHERE dirty = 1")
+        self._conn.commit()
+
+    def get_member(self, discord_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT username, discord_id, steam_id FROM members WHERE discord_id = ?", (str(discord_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"Username": row[0], "Discord ID": row[1], "Steam ID": row[2] or ""}
+
+    def get_steam_id_for_discord_id(self, discord_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT steam_id FROM members WHERE discord_id = ?", (str(discord_id),)
+            ).fetchone()
+        if row is None:
+            print(f"Discord ID {discord_id} not found in member storage.")
+            return None
+        return row[0] or None
+
+    def update_user_steam_id(self, discord_id, new_steam_id):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE members SET steam_id = ?, updated_at = ?, dirty = 1 WHERE discord_id = ?",
+                (new_steam_id, time.time(), str(discord_id))
+            )
+            self._conn.commit()
+        if cursor.rowcount == 0:
+            return False, f"Discord ID {discord_id} not found in member storage."
+        return True, f"Steam ID for Discord user {discord_id} updated successfully."
+
+    def add_new_discord_user(self, username, discord_id):
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO members (discord_id, username, steam_id, updated_at, dirty) VALUES (?, ?, NULL, ?, 1)",
+                (str(discord_id), username, time.time())
+            )
+            self._conn.commit()
+        if cursor.rowcount == 0:
+            return False, f"User '{username}' (ID: {discord_id}) already exists in member storage."
+        return True, f"User '{username}' (ID: {discord_id}) added successfully."
+
+    def add_new_discord_users(self, members):
+        now = time.time()
+        rows = [(str(discord_id), username, now) for username, discord_id in members]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO members (discord_id, username, steam_id, updated_at, dirty) VALUES (?, ?, NULL, ?, 1)",
+                rows
+            )
+            self._conn.commit()
+            added = self._conn.total_changes - before
+        return True, f"{added} user(s) added."
+
+    def get_member_ids(self):
+        with self._lock:
+            return {discord_id for (discord_id,) in self._conn.execute("SELECT discord_id FROM members")}
+
+    def has_unexported_changes(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM members WHERE dirty = 1 LIMIT 1").fetchone() is not None
+
+    def get_all_members_data(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT username, discord_id, steam_id FROM members ORDER BY rowid"
+            ).fetchall()
+        return [{"Username": username, "Discord ID": discord_id, "Steam ID": steam_id or ""}
+                for username, discord_id, steam_id in rows]
+
+    def import_from_sheet(self, directory):
+        """
+        Applies the sheet's member directory: inserts members that only exist in the sheet and takes the sheet's
+        Steam ID for rows without unexported local changes (so admin edits in the sheet win over stale local data).
+        Returns the number of rows inserted or changed.
+        """
+        changed = 0
+        now = time.time()
+        with self._lock:
+            local = {
+                discord_id: (steam_id, dirty)
+                for discord_id, steam_id, dirty in self._conn.execute("SELECT discord_id, steam_id, dirty FROM members")
+            }
+            for discord_id, entry in directory.items():
+                sheet_steam_id = entry["steam_id"] or None
+                if discord_id not in local:
+                    self._conn.execute(
+                        "INSERT INTO members (discord_id, username, steam_id, updated_at, dirty) VALUES (?, ?, ?, ?, 0)",
+                        (discord_id, entry.get("username") or "", sheet_steam_id, now)
+                    )
+                    changed += 1
+                else:
+                    local_steam_id, dirty = local[discord_id]
+                    if not dirty and (local_steam_id or None) != sheet_steam_id:
+                        self._conn.execute(
+                            "UPDATE members SET steam_id = ?, updated_at = ? WHERE discord_id = ?",
+                            (sheet_steam_id, now, discord_id)
+                        )
+                        changed += 1
+            self._conn.commit()
+        return changed
+
+    def export_to_sheet(self, directory):
+        """
+        Queues a sheet write for every locally changed row the sheet does not match yet. Dirty flags are cleared by
+        mark_exported() once the writes have landed, or here for rows the sheet already matches with nothing pending.
+        Returns the number of rows queued.
+        """
+        with self._lock:
+            dirty_rows = self._conn.execute(
+                "SELECT discord_id, username, steam_id FROM members WHERE dirty = 1"
+            ).fetchall()
+
+        exported = 0
+        in_sync = {}
+        for discord_id, username, steam_id in dirty_rows:
+            if sheets_manager.has_pending_write(discord_id, guild_id=self.guild_id):
+                continue
+            if discord_id in directory and (directory[discord_id]["steam_id"] or None) == (steam_id or None):
+                in_sync[discord_id] = steam_id
+                continue
+            if discord_id not in directory:
+                success, message = sheets_manager.add_new_discord_user(username, discord_id, guild_id=self.guild_id)
+                if not success:
+                    print(f"[Member Storage] Could not mirror {discord_id} to the sheet: {message}")
+                    continue
+            if steam_id and (discord_id not in directory or directory[discord_id]["steam_id"] != steam_id):
+                success, message = sheets_manager.update_user_steam_id(discord_id, steam_id, guild_id=self.guild_id)
+                if not success:
+                    print(f"[Member Storage] Could not mirror {discord_id} to the sheet: {message}")
+                    continue
+            exported += 1
+        if in_sync:
+            self.mark_exported(in_sync)
+        return exported
+
+    def mark_exported(self, written):
+        """
+        Clears the dirty flag of rows the sheet now holds. `written` maps Discord IDs to the Steam ID written;
+        rows changed again since then stay dirty.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE members SET dirty = 0 WHERE discord_id = ? AND steam_id IS ?",
+                [(str(discord_id), steam_id or None) for discord_id, steam_id in written.items()]
+            )
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+# Maps guild ID (None for the legacy, guild-less store) to its MemberStore.
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(guild_id=None):
+    """
+    Returns the member store for a guild (MEMBER_STORAGE_BACKEND: 'sqlite' or 'sheets').
+    Each guild gets its own SQLite database or worksheet, so one busy guild never contends with another.
+    """
+    key = str(guild_id) if guild_id is not None else None
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                if MEMBER_STORAGE_BACKEND == 'sheets':
+                    store = SheetsMemberStore(key)
+                elif key is None:
+                    store = SqliteMemberStore(MEMBER_DB_PATH)
+                else:
+                    store = SqliteMemberStore(os.path.join(MEMBER_DB_DIR, f"members-{key}.sqlite3"), guild_id=key)
+                if isinstance(store, SqliteMemberStore):
+                    sheets_manager.add_written_listener(store.mark_exported, guild_id=key)
+                _stores[key] = store
+    return store
+
+
+def _adopt_legacy_member(store, discord_id):
+    """
+    Copies a member from the legacy, guild-less store into a guild's store, so members linked before
+    storage was split per guild keep their Steam ID. Members already in the guild's store only take the legacy
+    Steam ID if they have none of their own. Returns the adopted record, or None if there was nothing to adopt.
+    """
+    if store.guild_id is None:
+        return None
+    legacy_member = get_store().get_member(discord_id)
+    if legacy_member is None:
+        return None
+    member = store.get_member(discord_id)
+    if member is not None and (member["Steam ID"] or not legacy_member["Steam ID"]):
+        return None
+    if member is None:
+        store.add_new_discord_user(legacy_member["Username"], discord_id)
+    if legacy_member["Steam ID"]:
+        store.update_user_steam_id(discord_id, legacy_member["Steam ID"])
+    print(f"[Member Storage] Adopted {discord_id} from the legacy store into guild {store.guild_id}.")
+    return legacy_member
+
+
+def _legacy_members(store):
+    """
+    Returns {discord_id: record} for the legacy, guild-less store, or {} if `store` is that store itself.
+    """
+    if store.guild_id is None:
+        return {}
+    return {str(member["Discord ID"]): member for member in get_store().get_all_members_data()}
+
+
+def sync_with_sheets(guild_id=None):
+    """
+    Mirrors a guild's SQLite store with its worksheet: imports sheet-side changes, then queues local changes for export.
+    Blocking; call it from a worker thread when running inside the event loop.
+    Returns (imported, exported) row counts, or None if the sheet is unavailable or the backend is not SQLite.
+    """
+    store = get_store(guild_id)
+    if not isinstance(store, SqliteMemberStore):
+        return None
+    directory = sheets_manager.get_member_directory_snapshot(refresh=True, guild_id=store.guild_id)
+    if directory is None:
+        print("[Member Storage] Google Sheet unavailable; keeping local data and retrying later.")
+        return None
+    imported = store.import_from_sheet(directory)
+    exported = store.export_to_sheet(directory)
+    if imported or exported:
+        print(f"[Member Storage] Sheet mirror sync ({store.guild_id or 'default'}): "
+              f"{imported} row(s) imported, {exported} row(s) exported.")
+    return imported, exported
+
+
+_mirror_rotation = 0
+
+
+def guilds_to_mirror(guild_ids, max_reads=MEMBER_MIRROR_MAX_READS):
+    """
+    Picks at most `max_reads` guilds for a mirror pass (one full-sheet read each), starting where the last pass
+    stopped: guilds with unexported local changes first, then guilds whose worksheet already exists, so sheet
+    edits are picked up. Guilds that never used their sheet are not read, and no worksheet is created for them
+    until they have something to export.
+    Blocking; call it from a worker thread when running inside the event loop.
+    """
+    global _mirror_rotation
+    guild_ids = list(guild_ids)
+    if MEMBER_STORAGE_BACKEND == 'sheets' or not guild_ids or max_reads <= 0:
+        return []
+    start = _mirror_rotation % len(guild_ids)
+    rotated = guild_ids[start:] + guild_ids[:start]
+    _mirror_rotation = start + max_reads
+
+    selected = [guild_id for guild_id in rotated if get_store(guild_id).has_unexported_changes()][:max_reads]
+    for guild_id in rotated:
+        if len(selected) >= max_reads:
+            break
+        if guild_id not in selected and sheets_manager.guild_sheet_exists(guild_id):
+            selected.append(guild_id)
+    return selected
+
+
+def get_steam_id_for_discord_id(discord_id, guild_id=None):
+    """
+    Retrieves the Steam ID for a given Discord ID in a guild.
+    Returns the Steam ID string or None if not found/error.
+    """
+    store = get_store(guild_id)
+    steam_id = store.get_steam_id_for_discord_id(discord_id)
+    if steam_id is None:
+        legacy_member = _adopt_legacy_member(store, discord_id)
+        if legacy_member is not None:
+            return legacy_member["Steam ID"] or None
+    return steam_id
+
+
+def update_user_steam_id(discord_id, new_steam_id, guild_id=None):
+    """
+    Updates the Steam ID for a given Discord user in a guild.
+    Returns (True, message) on success, (False, message) on failure.
+    """
+    store = get_store(guild_id)
+    if store.get_member(discord_id) is None:
+        _adopt_legacy_member(store, discord_id)
+    return store.update_user_steam_id(discord_id, new_steam_id)
+
+
+def add_new_discord_user(username, discord_id, guild_id=None):
+    """
+    Adds a new user to a guild if they are not already present, taking their Steam ID from the legacy store if
+    they were linked there.
+    Returns (True, message) on success, (False, message) on failure.
+    """
+    store = get_store(guild_id)
+    result = store.add_new_discord_user(username, discord_id)
+    _adopt_legacy_member(store, discord_id)
+    return result
+
+
+def reconcile_members(members, guild_id=None):
+    """
+    Adds every guild member missing from the guild's store in one batched write, e.g. members who joined
+    while the bot was offline. `members` is an iterable of (username, discord_id) pairs.
+    Blocking; call it from a worker thread when running inside the event loop.
+    Returns (True, number of members added) or (False, message) if the store could not be read.
+    """
+    store = get_store(guild_id)
+    known_ids = store.get_member_ids()
+    if known_ids is None:
+        return False, "Could not read the member list."
+    legacy_members = _legacy_members(store)
+    members = [(username, str(discord_id)) for username, discord_id in members]
+    missing = [
+        (legacy_members[discord_id]["Username"] if discord_id in legacy_members else username, discord_id)
+        for username, discord_id in members if discord_id not in known_ids
+    ]
+    if missing:
+        success, message = store.add_new_discord_users(missing)
+        if not success:
+            return False, message
+        print(f"[Member Storage] Reconciliation added {len(missing)} member(s) to guild {guild_id}.")
+
+    # Members linked before storage was split per guild keep their Steam ID, including rows added without one.
+    if legacy_members:
+        guild_steam_ids = {member["Discord ID"]: member["Steam ID"] for member in store.get_all_members_data()}
+        adopted = 0
+        for _, discord_id in members:
+            legacy_steam_id = legacy_members.get(discord_id, {}).get("Steam ID")
+            if legacy_steam_id and not guild_steam_ids.get(discord_id):
+                store.update_user_steam_id(discord_id, legacy_steam_id)
+                adopted += 1
+        if adopted:
+            print(f"[Member Storage] Reconciliation adopted {adopted} Steam ID(s) from the legacy store into guild {guild_id}.")
+    return True, len(missing)
+
+
+def get_all_members_data(guild_id=None):
+    """
+    Returns a guild's members as a list of dictionaries with 'Username', 'Discord ID' and 'Steam ID' keys.
+    """
+    return get_store(guild_id).get_all_members_data()
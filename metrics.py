@@ -0,0 +1,204 @@
+import os
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+from aiohttp import web
+
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
+
+# Upper bounds, in seconds, of the latency histogram buckets (the last bucket is +Inf).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram, cheap enough to update on every call.
+    Also tracks the smallest and largest observed values, which bound every quantile estimate.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        if not self.count:
+            self.min = self.max = seconds
+        else:
+            self.min = min(self.min, seconds)
+            self.max = max(self.max, seconds)
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """
+        Estimates a quantile by interpolating linearly inside the bucket that contains it,
+        clamped to the observed minimum and maximum.
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        estimate = self.max
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= target and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (target - seen) / bucket_count
+                break
+            seen += bucket_count
+        return min(max(estimate, self.min), self.max)
+
+
+def _bucket_labels(histogram):
+    return [str(bound) for bound in histogram.buckets] + ["+Inf"]
+
+
+class CallTimer:
+    """
+    Handle yielded by MetricsRegistry.timed(); set `failed` to count the call as an error without raising.
+    """
+
+    def __init__(self):
+        self.failed = False
+
+
+class MetricsRegistry:
+    """
+    In-process registry of latency histograms, call counts and error counts, keyed by (kind, name),
+    e.g. ("steam", "appdetails"), ("sheets", "append_rows") or ("command", "letsplay").
+    """
+
+    def __init__(self):
+        self.latency = {}
+        self.calls = Counter()
+        self.errors = Counter()
+        self._cache_sources = {}
+
+    def observe(self, kind, name, seconds, error=False):
+        key = (kind, name)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram()
+        histogram.observe(seconds)
+        self.calls[key] += 1
+        if error:
+            self.errors[key] += 1
+
+    @contextmanager
+    def timed(self, kind, name):
+        """
+        Times the enclosed block (which may contain awaits) and records it; exceptions count as errors.
+        """
+        timer = CallTimer()
+        start = time.perf_counter()
+        try:
+            yield timer
+        except BaseException:
+            timer.failed = True
+            raise
+        finally:
+            self.observe(kind, name, time.perf_counter() - start, error=timer.failed)
+
+    def register_cache(self, name, stats_function):
+        """
+        Registers a callable returning a dict with at least 'hits' and 'misses' for a cache.
+        """
+        self._cache_sources[name] = stats_function
+
+    def cache_stats(self):
+        stats = {}
+        for name, stats_function in self._cache_sources.items():
+            try:
+                stats[name] = stats_function()
+            except Exception as e:
+                print(f"[Metrics] Could not read stats for cache '{name}': {e}")
+        return stats
+
+    def render_prometheus(self):
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP steambot_call_duration_seconds Latency of external calls and slash commands.",
+            "# TYPE steambot_call_duration_seconds histogram",
+        ]
+        for (kind, name), histogram in sorted(self.latency.items()):
+            labels = f'kind="{kind}",name="{name}"'
+            cumulative = 0
+            for bound, bucket_count in zip(_bucket_labels(histogram), histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'steambot_call_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"steambot_call_duration_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"steambot_call_duration_seconds_count{{{labels}}} {histogram.count}")
+
+        lines.append("# HELP steambot_call_errors_total Failed external calls and slash commands.")
+        lines.append("# TYPE steambot_call_errors_total counter")
+        for (kind, name) in sorted(self.calls):
+            lines.append(f'steambot_call_errors_total{{kind="{kind}",name="{name}"}} {self.errors[(kind, name)]}')
+
+        lines.append("# HELP steambot_cache_requests_total Cache lookups by result.")
+        lines.append("# TYPE steambot_cache_requests_total counter")
+        for cache_name, stats in sorted(self.cache_stats().items()):
+            lines.append(f'steambot_cache_requests_total{{cache="{cache_name}",result="hit"}} {stats.get("hits", 0)}')
+            lines.append(f'steambot_cache_requests_total{{cache="{cache_name}",result="miss"}} {stats.get("misses", 0)}')
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self):
+        """
+        Returns a compact plain-text table for the /bot-stats command.
+        """
+        lines = [f"{'call':<32} {'count':>6} {'err':>4} {'avg ms':>8} {'p50 ms':>8} {'p95 ms':>8}"]
+        for (kind, name), histogram in sorted(self.latency.items()):
+            average = histogram.sum / histogram.count if histogram.count else 0.0
+            lines.append(
+                f"{kind + ':' + name:<32} {histogram.count:>6} {self.errors[(kind, name)]:>4} "
+                f"{average * 1000:>8.1f} {histogram.quantile(0.5) * 1000:>8.1f} {histogram.quantile(0.95) * 1000:>8.1f}"
+            )
+        for cache_name, stats in sorted(self.cache_stats().items()):
+            lookups = stats.get("hits", 0) + stats.get("misses", 0)
+            ratio = stats.get("hits", 0) / lookups if lookups else 0.0
+            lines.append(f"cache:{cache_name:<26} {lookups:>6} hit ratio {ratio:.1%}")
+        return "\n".join(lines)
+
+
+registry = MetricsRegistry()
+
+
+def timed(kind, name):
+    """
+    Shortcut for registry.timed(kind, name).
+    """
+    return registry.timed(kind, name)
+
+
+async def start_exporter(host=METRICS_HOST, port=METRICS_PORT):
+    """
+    Serves GET /metrics in Prometheus text format on a local port. Returns the runner, or None if disabled.
+    """
+    if not port:
+        return None
+
+    async def handle_metrics(request):
+        return web.Response(text=registry.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"[Metrics] Could not start Prometheus exporter on {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    print(f"[Metrics] Prometheus exporter listening on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,436 @@
+"""
+Transport-independent engine behind /letsplay: given Steam IDs, finds the multiplayer games they all own,
+ranked by the group's playtime, with per-player diagnostics.
+
+Run it headless to pre-compute many groups or load-test it without Discord:
+
+    python query_engine.py groups.txt --concurrency 8 --output results.jsonl
+
+Each line of the groups file is one group of whitespace- or comma-separated Steam IDs, optionally prefixed
+with a name and a colon ("friday night: 7656... 7656..."). Blank lines and lines starting with # are skipped.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import cache_manager  # noqa: E402
+import ranking  # noqa: E402
+import steam_api_manager  # noqa: E402
+
+
+APP_DETAILS_CONCURRENCY = int(os.getenv('APP_DETAILS_CONCURRENCY', 8))
+# Seconds a query may spend waiting on Steam before answering from cached data.
+LETSPLAY_DEADLINE = float(os.getenv('LETSPLAY_DEADLINE', 20))
+BATCH_CONCURRENCY = int(os.getenv('QUERY_BATCH_CONCURRENCY', 8))
+
+# Steam lookups that outlived a query's deadline; they finish in the background and fill the caches.
+background_lookups = set()
+
+
+def _finish_background_lookup(task):
+    background_lookups.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[Steam API] Background lookup failed: {type(task.exception()).__name__}: {task.exception()}")
+
+
+def keep_in_background(tasks):
+    """
+    Lets unfinished tasks run to completion in the background. Returns how many were still running.
+    """
+    unfinished = 0
+    for task in tasks:
+        if not task.done():
+            unfinished += 1
+            background_lookups.add(task)
+            task.add_done_callback(_finish_background_lookup)
+    return unfinished
+
+
+async def gather_until(deadline, coroutines):
+    """
+    Runs coroutines concurrently until `deadline` (a time.monotonic() value).
+    Returns (results, unfinished): results holds None for calls that failed or were still running at the deadline;
+    those keep running in the background so their answers still reach the caches.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    if tasks:
+        await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+    results = [
+        task.result() if task.done() and not task.cancelled() and task.exception() is None else None
+        for task in tasks
+    ]
+    return results, keep_in_background(tasks)
+
+
+class SteamTransport:
+    """
+    Default transport: the Steam Web API and store, through steam_api_manager's shared, rate-limited client.
+    A transport provides `get_library(steam_id)` (a (appids, playtime_forever, playtime_2weeks) triple of sorted,
+    aligned arrays, empty for a private profile, None on failure) and `get_game_details(appid)` (a GameInfo, or None).
+    """
+
+    async def get_library(self, steam_id):
+        return await steam_api_manager.get_library(steam_id)
+
+    async def get_game_details(self, appid):
+        return await steam_api_manager.get_game_details(appid)
+
+
+class CacheOnlyTransport:
+    """
+    Transport that never contacts Steam, so every query is answered from the cache layer's stale data.
+    Useful for profiling the engine itself and for load tests that must not spend the Steam API budget.
+    """
+
+    async def get_library(self, steam_id):
+        return None
+
+    async def get_game_details(self, appid):
+        return None
+
+
+class LocalCacheLayer:
+    """
+    Default cache layer: the bot's SQLite caches, category index, app catalog and group-result cache.
+    `get_cached_library` returns the same triple as a transport's `get_library`.
+    """
+
+    def get_cached_library(self, steam_id):
+        return steam_api_manager.get_cached_library(steam_id)
+
+    def get_cached_game_details(self, appid):
+        return steam_api_manager.get_cached_game_details(appid)
+
+    def get_catalog_game_info(self, appid):
+        return steam_api_manager.get_catalog_game_info(appid)
+
+    def partition_multiplayer(self, appids):
+        return cache_manager.get_category_index().partition_multiplayer(appids)
+
+    def get_group_result(self, steam_ids):
+        return cache_manager.get_group_result_cache().get(steam_ids)
+
+    def put_group_result(self, steam_ids, result, appids):
+        cache_manager.get_group_result_cache().put(steam_ids, result, appids)
+
+
+class PlayerDiagnostics:
+    """
+    How one player's library was obtained: `status` is "ok", "private" (no public games) or "failed",
+    and `source` is "steam", "stale cache" or "group cache".
+    """
+
+    def __init__(self, steam_id):
+        self.steam_id = steam_id
+        self.status = "failed"
+        self.source = None
+        self.game_count = 0
+        self.seconds = None
+
+    def to_dict(self):
+        return {
+            "steam_id": self.steam_id,
+            "status": self.status,
+            "source": self.source,
+            "game_count": self.game_count,
+            "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+        }
+
+
+class QueryResult:
+    """
+    Ranked common multiplayer games for a group, with per-player diagnostics.
+    `games` and `weights` are parallel lists, best first. `possibly_stale` is set when any part of the answer
+    came from expired cache entries or Steam lookups were still running at the deadline.
+    """
+
+    def __init__(self, steam_ids):
+        self.steam_ids = steam_ids
+        self.players = {steam_id: PlayerDiagnostics(steam_id) for steam_id in steam_ids}
+        self.games = []
+        self.weights = []
+        self.common_game_count = 0
+        self.possibly_stale = False
+        self.stale_steam_ids = []
+        self.stale_appids = []
+        self.from_group_cache = False
+        self.seconds = None
+
+    @property
+    def player_count(self):
+        """
+        Number of players whose libraries were compared.
+        """
+        return sum(1 for player in self.players.values() if player.status == "ok")
+
+    def to_dict(self):
+        return {
+            "steam_ids": self.steam_ids,
+            "player_count": self.player_count,
+            "common_game_count": self.common_game_count,
+            "games": [
+                {"appid": game.appid, "name": game.display_name, "score": round(weight, 4)}
+                for game, weight in zip(self.games, self.weights)
+            ],
+            "players": [player.to_dict() for player in self.players.values()],
+            "possibly_stale": self.possibly_stale,
+            "from_group_cache": self.from_group_cache,
+            "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+        }
+
+
+class QueryEngine:
+    """
+    Finds the multiplayer games shared by a group of Steam users.
+    Steam is reached through `transport` and local data through `cache`; both default to the bot's own.
+    Lookups still running at the deadline, or failing because Steam is down, are answered from the cache layer's
+    last known data, and the result is marked as possibly stale.
+    """
+
+    def __init__(self, transport=None, cache=None, details_concurrency=APP_DETAILS_CONCURRENCY,
+                 deadline=LETSPLAY_DEADLINE):
+        self.transport = transport or SteamTransport()
+        self.cache = cache or LocalCacheLayer()
+        self.details_concurrency = details_concurrency
+        self.deadline = deadline
+
+    async def _fetch_library(self, steam_id):
+        start = time.perf_counter()
+        library = await self.transport.get_library(steam_id)
+        return library, time.perf_counter() - start
+
+    async def find_common_games(self, steam_ids, deadline=None, progress=None):
+        """
+        Returns a QueryResult for `steam_ids`. `deadline` is a time.monotonic() value (default: `self.deadline`
+        seconds from now); `progress`, if given, is called with a short status line as the query advances.
+        """
+        start = time.perf_counter()
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline
+        report = progress or (lambda status: None)
+        steam_ids = list(dict.fromkeys(str(steam_id) for steam_id in steam_ids))
+        result = QueryResult(steam_ids)
+
+        if len(steam_ids) >= 2:
+            cached_result = self.cache.get_group_result(steam_ids)
+            if cached_result is not None:
+                result.games, result.weights = cached_result
+                result.common_game_count = len(result.games)
+                result.from_group_cache = True
+                for player in result.players.values():
+                    player.status, player.source = "ok", "group cache"
+                result.seconds = time.perf_counter() - start
+                return result
+
+        report(f"Fetching Steam libraries for {len(steam_ids)} players...")
+        library_results, unfinished_libraries = await gather_until(
+            deadline, [self._fetch_library(steam_id) for steam_id in steam_ids]
+        )
+        libraries = {}
+        for steam_id, fetched in zip(steam_ids, library_results):
+            player = result.players[steam_id]
+            library, player.seconds = fetched if fetched is not None else (None, None)
+            player.source = "steam"
+            if library is None:
+                library = self.cache.get_cached_library(steam_id)
+                player.source = "stale cache" if library is not None else None
+                if library is not None:
+                    result.stale_steam_ids.append(steam_id)
+            if library is None:
+                player.status = "failed"
+            elif not library[0]:
+                player.status = "private"
+            else:
+                player.status = "ok"
+                player.game_count = len(library[0])
+                libraries[steam_id] = library
+
+        if len(libraries) < 2:
+            result.possibly_stale = bool(result.stale_steam_ids or unfinished_libraries)
+            result.seconds = time.perf_counter() - start
+            return result
+
+        common_game_appids = cache_manager.intersect_sorted_appids([library[0] for library in libraries.values()])
+        result.common_game_count = len(common_game_appids)
+
+        multiplayer_appids, unindexed_appids = self.cache.partition_multiplayer(common_game_appids)
+        multiplayer_game_appids = set(multiplayer_appids)
+        game_details = {}
+        total_to_check = len(unindexed_appids)
+        processed_count = 0
+
+        if total_to_check > 5:
+            report(f"Found {len(common_game_appids)} common games. "
+                   "Now checking for multiplayer status (this may take a moment)...")
+
+        app_details_semaphore = asyncio.Semaphore(self.details_concurrency)
+
+        async def fetch_details(appid):
+            async with app_details_semaphore:
+                return appid, await self.transport.get_game_details(appid)
+
+        checks = [asyncio.ensure_future(fetch_details(appid)) for appid in unindexed_appids]
+        try:
+            for check in asyncio.as_completed(checks, timeout=max(0.0, deadline - time.monotonic())):
+                appid, game = await check
+                if game is not None:
+                    game_details[appid] = game
+                    if game.is_multiplayer:
+                        multiplayer_game_appids.add(appid)
+
+                processed_count += 1
+                if total_to_check > 5:
+                    report(f"Found {len(common_game_appids)} common games. "
+                           f"Checking for multiplayer status... ({processed_count}/{total_to_check} checked)")
+        except asyncio.TimeoutError:
+            pass
+        unfinished_checks = keep_in_background(checks)
+
+        # Apps Steam could not describe in time (or at all) are judged from their last cached details.
+        for appid in unindexed_appids:
+            if appid not in game_details:
+                game = self.cache.get_cached_game_details(appid)
+                if game is not None:
+                    game_details[appid] = game
+                    result.stale_appids.append(appid)
+                    if game.is_multiplayer:
+                        multiplayer_game_appids.add(appid)
+
+        unfinished_details = 0
+        if multiplayer_game_appids:
+            # Names come from local data (cached app details, then the app catalog) whenever possible;
+            # the store is only asked about apps neither of them knows.
+            for appid in multiplayer_game_appids:
+                if appid not in game_details:
+                    game = self.cache.get_cached_game_details(appid) or self.cache.get_catalog_game_info(appid)
+                    if game is not None:
+                        game_details[appid] = game
+            appids_to_fetch = [appid for appid in multiplayer_game_appids if appid not in game_details]
+            detail_results, unfinished_details = await gather_until(
+                deadline, [fetch_details(appid) for appid in appids_to_fetch]
+            )
+            for appid, fetched in zip(appids_to_fetch, detail_results):
+                game = fetched[1] if fetched is not None else None
+                game_details[appid] = game or steam_api_manager.GameInfo(appid)
+
+            scores = dict(ranking.rank_games(multiplayer_game_appids, list(libraries.values())))
+            result.games = sorted((game_details[appid] for appid in multiplayer_game_appids),
+                                  key=lambda game: (-scores[game.appid], game.display_name))
+            result.weights = [scores[game.appid] for game in result.games]
+
+        result.possibly_stale = bool(result.stale_steam_ids or result.stale_appids or unfinished_libraries
+                                     or unfinished_checks or unfinished_details)
+        if not result.possibly_stale and len(libraries) == len(steam_ids):
+            self.cache.put_group_result(steam_ids, (result.games, result.weights), common_game_appids)
+        result.seconds = time.perf_counter() - start
+        return result
+
+
+_engine = None
+
+
+def get_engine():
+    """
+    Returns the process-wide QueryEngine using the Steam transport and the local caches.
+    """
+    global _engine
+    if _engine is None:
+        _engine = QueryEngine()
+    return _engine
+
+
+def read_groups(path):
+    """
+    Yields (name, steam_ids) for each group in a groups file; unnamed groups are named after their line number.
+    """
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            name, separator, ids = line.rpartition(':')
+            if not separator:
+                name = f"line {line_number}"
+            steam_ids = [steam_id for steam_id in re.split(r'[\s,]+', ids) if steam_id]
+            yield name.strip() or f"line {line_number}", steam_ids
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+async def run_batch(groups, engine, concurrency=BATCH_CONCURRENCY, output=sys.stdout):
+    """
+    Runs every (name, steam_ids) group through `engine`, at most `concurrency` at a time, writing one JSON line
+    per group to `output` as results arrive. Returns the list of (name, QueryResult) pairs.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_group(name, steam_ids):
+        async with semaphore:
+            result = await engine.find_common_games(steam_ids)
+        output.write(json.dumps({"group": name, **result.to_dict()}) + "\n")
+        output.flush()
+        return name, result
+
+    return await asyncio.gather(*(run_group(name, steam_ids) for name, steam_ids in groups))
+
+
+async def _main_async(args):
+    await asyncio.to_thread(cache_manager.load_local_caches)
+    transport = CacheOnlyTransport() if args.offline else SteamTransport()
+    engine = QueryEngine(transport=transport, deadline=args.deadline)
+    groups = list(read_groups(args.groups))
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        results = await run_batch(groups, engine, concurrency=args.concurrency, output=output)
+    finally:
+        if args.output:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    if background_lookups:
+        # Let lookups that outlived their query's deadline land in the caches before the client closes.
+        await asyncio.wait(list(background_lookups), timeout=args.deadline)
+    await steam_api_manager.close_client()
+    await asyncio.to_thread(cache_manager.flush_caches)
+    cache_manager.get_category_index().save_if_dirty()
+
+    latencies = [result.seconds for _, result in results]
+    print(
+        f"{len(results)} group(s) in {elapsed:.2f}s ({len(results) / elapsed if elapsed else 0:.1f} groups/s); "
+        f"p50 {_percentile(latencies, 50) * 1000:.1f} ms, p95 {_percentile(latencies, 95) * 1000:.1f} ms, "
+        f"p99 {_percentile(latencies, 99) * 1000:.1f} ms; "
+        f"{sum(1 for _, result in results if result.possibly_stale)} possibly stale, "
+        f"{sum(1 for _, result in results if result.from_group_cache)} from the group cache.",
+        file=sys.stderr,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find common multiplayer games for many groups of Steam users.")
+    parser.add_argument("groups", help="File with one group of Steam IDs per line.")
+    parser.add_argument("--output", help="Write JSON lines here instead of stdout.")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Groups queried at once.")
+    parser.add_argument("--deadline", type=float, default=LETSPLAY_DEADLINE,
+                        help="Seconds each group may wait on Steam before answering from cached data.")
+    parser.add_argument("--offline", action="store_true", help="Never contact Steam; answer from local caches only.")
+    args = parser.parse_args()
+    asyncio.run(_main_async(args))
+
+
+if __name__ == "__main__":
+    main()
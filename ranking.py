@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+
+
+# Relative weight of each signal in a game's score.
+TOTAL_PLAYTIME_WEIGHT = float(os.getenv('RANKING_TOTAL_PLAYTIME_WEIGHT', 1.0))
+RECENT_PLAYTIME_WEIGHT = float(os.getenv('RANKING_RECENT_PLAYTIME_WEIGHT', 2.0))
+FAIRNESS_WEIGHT = float(os.getenv('RANKING_FAIRNESS_WEIGHT', 1.5))
+# Floor added to every score so unplayed games can still be picked at random.
+BASE_SCORE = 0.25
+
+
+def _playtime_rows(appids, library):
+    """
+    Looks up one player's playtimes for `appids` (a sorted uint32 array) in their cached library.
+    Returns two float arrays of hours: total and last two weeks. Missing games count as zero.
+    """
+    if library is None or not len(library[0]):
+        return np.zeros(len(appids)), np.zeros(len(appids))
+    library_appids, library_forever, library_recent = (np.frombuffer(column, dtype=np.uint32) for column in library)
+    positions = np.minimum(np.searchsorted(library_appids, appids), len(library_appids) - 1)
+    owned = library_appids[positions] == appids
+    forever = np.where(owned, library_forever[positions], 0) / 60
+    recent = np.where(owned, library_recent[positions], 0) / 60
+    return forever, recent
+
+
+def rank_games(appids, libraries):
+    """
+    Scores common games from a players x games playtime matrix.
+
+    `libraries` holds one (appids, playtime_forever, playtime_2weeks) triple per player, as returned by
+    LibraryCache.get_playtimes(), or None when a player's playtimes are unknown.
+    Each game's score combines the group's total playtime, its recent playtime (both log-damped) and a
+    fairness term: the share of players who have played it, times how evenly the playtime is spread.
+    The matrix is built with one vectorized lookup per player and scored column-wise with NumPy.
+
+    Returns a list of (appid, score) pairs sorted by descending score.
+    """
+    appids = np.array(sorted(int(appid) for appid in appids), dtype=np.uint32)
+    if not len(appids):
+        return []
+
+    rows = [_playtime_rows(appids, library) for library in libraries] or [_playtime_rows(appids, None)]
+    hours = np.vstack([forever for forever, _ in rows])
+    recent_hours = np.vstack([recent for _, recent in rows]).sum(axis=0)
+    total_hours = hours.sum(axis=0)
+    played_share = (hours > 0).sum(axis=0) / max(1, len(libraries))
+    most_hours = hours.max(axis=0)
+    evenness = np.divide(hours.min(axis=0), most_hours, out=np.zeros(len(appids)), where=total_hours > 0)
+    scores = (BASE_SCORE
+              + TOTAL_PLAYTIME_WEIGHT * np.log1p(total_hours)
+              + RECENT_PLAYTIME_WEIGHT * np.log1p(recent_hours)
+              + FAIRNESS_WEIGHT * played_share * (0.5 + 0.5 * evenness))
+
+    order = np.argsort(-scores, kind='stable')
+    return list(zip(appids[order].tolist(), scores[order].tolist()))
@@ -1,6 +1,11 @@
 import os
+import re
+import threading
+import time
 import gspread
 
+import metrics
+
 from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound, APIError
 
 
@@ -8,125 +13,593 @@ CREDENTIALS_FILE = os.getenv('CREDENTIALS_FILE')
 SPREADSHEET_KEY = os.getenv('SPREADSHEET_KEY')
 WORKSHEET_NAME = os.getenv('SHEET_NAME')
 
-_cached_worksheet = None
+MEMBER_DIRECTORY_TTL = float(os.getenv('MEMBER_DIRECTORY_TTL', 300))
+SHEETS_FLUSH_INTERVAL = float(os.getenv('SHEETS_FLUSH_INTERVAL', 10))
+SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', 5))
+SHEETS_RETRY_BASE_DELAY = float(os.getenv('SHEETS_RETRY_BASE_DELAY', 1))
+# Seconds any single Google API HTTP request may take; gspread waits forever by default.
+SHEETS_HTTP_TIMEOUT = float(os.getenv('SHEETS_HTTP_TIMEOUT', 30))
+
+# Worksheet title for a guild's members; {sheet_name} is SHEET_NAME and {guild_id} the guild's ID.
+GUILD_WORKSHEET_FORMAT = os.getenv('GUILD_WORKSHEET_FORMAT', '{sheet_name} {guild_id}')
+MEMBER_SHEET_HEADER = ["Username", "Discord ID", "Steam ID"]
+
+_cached_spreadsheet = None
+_spreadsheet_lock = threading.Lock()
+# Titles of the spreadsheet's worksheets and when they were listed (time.monotonic()).
+_worksheet_titles = None
+_worksheet_titles_loaded_at = 0
 
-def _get_worksheet():
+
+def _get_spreadsheet():
     """
-    Establishes connection to Google Sheet and returns the worksheet object.
-    Caches the worksheet object after the first successful connection.
-    Returns the worksheet object or None on failure.
+    Establishes connection to the Google Spreadsheet and returns it.
+    Caches the spreadsheet object after the first successful connection.
+    Returns the spreadsheet object or None on failure.
     """
-    global _cached_worksheet
-    if _cached_worksheet:
-        return _cached_worksheet
+    global _cached_spreadsheet
+    if _cached_spreadsheet:
+        return _cached_spreadsheet
 
+    with _spreadsheet_lock:
+        if _cached_spreadsheet:
+            return _cached_spreadsheet
+        try:
+            gc = gspread.service_account(filename=CREDENTIALS_FILE)
+            gc.set_timeout(SHEETS_HTTP_TIMEOUT)
+            print("[Sheets Manager] Gspread client initialized.")
+
+            spreadsheet = gc.open_by_key(SPREADSHEET_KEY)
+            print(f"[Sheets Manager] Spreadsheet '{SPREADSHEET_KEY}' opened.")
+            _cached_spreadsheet = spreadsheet
+            return spreadsheet
+
+        except SpreadsheetNotFound:
+            print(f"[Sheets Manager] CRITICAL ERROR: Spreadsheet with key '{SPREADSHEET_KEY}' not found. "
+                  "Please double-check the SPREADSHEET_KEY in sheets_manager.py.")
+        except APIError as e:
+            print(f"[Sheets Manager] CRITICAL ERROR: Google Sheets API error: {e}. "
+                  "This often means incorrect permissions or API not enabled. "
+                  "Ensure the service account has 'Editor' access to the sheet and "
+                  "Google Sheets API/Google Drive API are enabled in Google Cloud Console.")
+        except Exception as e:
+            print(f"[Sheets Manager] UNEXPECTED ERROR during connection: {type(e).__name__}: {e}. "
+                  "This might indicate a network issue, firewall, or a corrupted credentials file.")
+        return None
+
+
+def get_worksheet_titles(max_age=MEMBER_DIRECTORY_TTL):
+    """
+    Returns the set of worksheet titles in the spreadsheet, listed with one metadata read at most every `max_age`
+    seconds. Returns None if the spreadsheet is unavailable.
+    """
+    global _worksheet_titles, _worksheet_titles_loaded_at
+    if _worksheet_titles is not None and time.monotonic() - _worksheet_titles_loaded_at < max_age:
+        return _worksheet_titles
+    spreadsheet = _get_spreadsheet()
+    if not spreadsheet:
+        return None
     try:
-        gc = gspread.service_account(filename=CREDENTIALS_FILE)
-        print("[Sheets Manager] Gspread client initialized.")
-
-        spreadsheet = gc.open_by_key(SPREADSHEET_KEY)
-        print(f"[Sheets Manager] Spreadsheet '{SPREADSHEET_KEY}' opened.")
-
-        worksheet = spreadsheet.worksheet(WORKSHEET_NAME)
-        print(f"[Sheets Manager] Successfully connected to Google Sheet: '{WORKSHEET_NAME}'")
-        _cached_worksheet = worksheet
-        return worksheet
-
-    except SpreadsheetNotFound:
-        print(f"[Sheets Manager] CRITICAL ERROR: Spreadsheet with key '{SPREADSHEET_KEY}' not found. "
-              "Please double-check the SPREADSHEET_KEY in sheets_manager.py.")
-    except WorksheetNotFound:
-        print(f"[Sheets Manager] CRITICAL ERROR: Worksheet '{WORKSHEET_NAME}' not found in the spreadsheet. "
-              "Please double-check the WORKSHEET_NAME in sheets_manager.py (case-sensitive!).")
-    except APIError as e:
-        print(f"[Sheets Manager] CRITICAL ERROR: Google Sheets API error: {e}. "
-              "This often means incorrect permissions or API not enabled. "
-              "Ensure the service account has 'Editor' access to the sheet and "
-              "Google Sheets API/Google Drive API are enabled in Google Cloud Console.")
+        worksheets = _with_backoff(spreadsheet.worksheets, "worksheets")
     except Exception as e:
-        print(f"[Sheets Manager] UNEXPECTED ERROR during connection: {type(e).__name__}: {e}. "
-              "This might indicate a network issue, firewall, or a corrupted credentials file.")
-    return None
+        print(f"[Sheets Manager] ERROR: Could not list worksheets: {e}")
+        return _worksheet_titles
+    _worksheet_titles = {worksheet.title for worksheet in worksheets}
+    _worksheet_titles_loaded_at = time.monotonic()
+    return _worksheet_titles
 
 
-def get_all_members_data():
+def _row_from_append_response(response):
     """
-    Fetches all records from the worksheet and returns a list of dictionaries.
+    Extracts the row number written by append_row from the API's updatedRange (e.g. 'Sheet1!A5:C5').
+    """
+    try:
+        updated_range = response["updates"]["updatedRange"]
+    except (TypeError, KeyError):
+        return None
+    match = re.search(r'![A-Z]+(\d+)', updated_range)
+    return int(match.group(1)) if match else None
+
+
+def _with_backoff(operation, description):
     """
-    worksheet = _get_worksheet()
-    if worksheet:
+    Runs a Sheets API call, retrying with exponential backoff on APIError (e.g. 429 quota errors).
+    Re-raises the last error once SHEETS_MAX_RETRIES attempts have failed.
+    """
+    delay = SHEETS_RETRY_BASE_DELAY
+    for attempt in range(1, SHEETS_MAX_RETRIES + 1):
         try:
-            return worksheet.get_all_records()
+            with metrics.timed("sheets", description):
+                return operation()
+        except APIError as e:
+            if attempt == SHEETS_MAX_RETRIES:
+                raise
+            print(f"[Sheets Manager] {description} failed ({e}); retrying in {delay:.1f}s "
+                  f"(attempt {attempt}/{SHEETS_MAX_RETRIES}).")
+            time.sleep(delay)
+            delay *= 2
+
+
+class SheetWriteQueue:
+    """
+    Write-behind queue for one member worksheet's mutations.
+    New rows and Steam ID updates are held in memory, deduplicated by Discord ID, and written
+    out by flush() as one append_rows call and one batch_update call.
+    Written listeners are told which rows actually reached the worksheet, with the Steam ID written.
+    """
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._appends = {}
+        self._updates = {}
+        self._in_flight = set()
+        self._written_listeners = []
+
+    def add_written_listener(self, callback):
+        """
+        Registers callback({discord_id: steam_id}), called after each flush with the rows it wrote.
+        """
+        self._written_listeners.append(callback)
+
+    def _notify_written(self, written):
+        for callback in self._written_listeners:
+            try:
+                callback(written)
+            except Exception as e:
+                print(f"[Sheets Manager] Written listener failed: {type(e).__name__}: {e}")
+
+    def has_pending(self, discord_id):
+        """
+        Returns True if a write for `discord_id` is queued or being flushed.
+        """
+        discord_id = str(discord_id)
+        with self._lock:
+            return discord_id in self._appends or discord_id in self._updates or discord_id in self._in_flight
+
+    def enqueue_append(self, username, discord_id, steam_id=""):
+        with self._lock:
+            self._appends.setdefault(str(discord_id), [username, str(discord_id), steam_id])
+
+    def enqueue_steam_id_update(self, discord_id, steam_id):
+        with self._lock:
+            pending_row = self._appends.get(str(discord_id))
+            if pending_row is not None:
+                pending_row[2] = steam_id
+            else:
+                self._updates[str(discord_id)] = steam_id
+
+    def depth(self):
+        """
+        Returns the number of pending writes (rows to append plus cells to update).
+        """
+        with self._lock:
+            return len(self._appends) + len(self._updates)
+
+    def overlay(self, directory):
+        """
+        Re-applies pending writes on top of a freshly loaded member directory.
+        """
+        with self._lock:
+            for discord_id, row in self._appends.items():
+                directory.setdefault(discord_id, {"row": None, "username": row[0], "steam_id": row[2] or None})
+            for discord_id, steam_id in self._updates.items():
+                if discord_id in directory:
+                    directory[discord_id]["steam_id"] = steam_id
+
+    def _requeue(self, appends, updates):
+        with self._lock:
+            for discord_id, row in appends.items():
+                if discord_id in self._updates:
+                    row[2] = self._updates.pop(discord_id)
+                self._appends.setdefault(discord_id, row)
+            for discord_id, steam_id in updates.items():
+                self._updates.setdefault(discord_id, steam_id)
+
+    def flush(self):
+        """
+        Writes all pending mutations to the worksheet.
+        Returns True if the queue was drained, False if anything had to be re-queued.
+        """
+        with self._flush_lock:
+            with self._lock:
+                appends, self._appends = self._appends, {}
+                updates, self._updates = self._updates, {}
+                self._in_flight = set(appends) | set(updates)
+            if not appends and not updates:
+                return True
+            written = {}
+            try:
+                return self._write(appends, updates, written)
+            finally:
+                with self._lock:
+                    self._in_flight = set()
+                if written:
+                    self._notify_written(written)
+
+    def _write(self, appends, updates, written):
+        """
+        Applies one batch of appends and updates, recording every row that reached the worksheet in `written`.
+        """
+        worksheet = self.sheet.get_worksheet()
+        if not worksheet:
+            self._requeue(appends, updates)
+            return False
+
+        directory = self.sheet.directory or {}
+        unresolved = {}
+        try:
+            if updates:
+                data = []
+                for discord_id, steam_id in updates.items():
+                    entry = directory.get(discord_id)
+                    if not entry or not entry["row"]:
+                        unresolved[discord_id] = steam_id
+                        continue
+                    data.append({"range": f"C{entry['row']}", "values": [[steam_id]]})
+                if data:
+                    _with_backoff(lambda: worksheet.batch_update(data, value_input_option="RAW"), "batch_update")
+                written.update(
+                    (discord_id, steam_id) for discord_id, steam_id in updates.items() if discord_id not in unresolved
+                )
+                updates = {}
+
+            if appends:
+                rows = list(appends.values())
+                response = _with_backoff(
+                    lambda: worksheet.append_rows(rows, value_input_option="RAW"), "append_rows"
+                )
+                start_row = _row_from_append_response(response)
+                for offset, discord_id in enumerate(appends):
+                    entry = directory.get(discord_id)
+                    if entry is not None and start_row:
+                        entry["row"] = start_row + offset
+                if not start_row:
+                    self.sheet.invalidate_directory()
+                print(f"[Sheets Manager] Appended {len(rows)} new member row(s) to '{self.sheet.worksheet_name}'.")
+                written.update((discord_id, row[2]) for discord_id, row in appends.items())
+                appends = {}
         except Exception as e:
-            print(f"Error fetching records: {e}")
-            return []
-    else:
-        print("Warning: Google Sheet connection not established. Cannot fetch records.")
-    return []
+            print(f"[Sheets Manager] ERROR: Failed to flush pending writes to '{self.sheet.worksheet_name}': {e}")
+            self._requeue(appends, {**unresolved, **updates})
+            return False
 
+        if unresolved:
+            self._requeue({}, unresolved)
+            return False
+        return True
 
-def add_new_discord_user(username, discord_id):
+
+class MemberSheet:
     """
-    Adds a new user to the Google Sheet if they are not already present.
+    One member worksheet with its in-memory member directory and write-behind queue.
+    The default sheet (SHEET_NAME) holds members not tied to a guild; every guild gets its own worksheet,
+    created on first use, so guilds never share a directory lock, a full-sheet read or a write queue.
     """
-    worksheet = _get_worksheet()
-    if not worksheet:
-        return False, "Could not connect to Google Sheet."
-    
-    try:
-        existing_discord_ids = [str(id_val) for id_val in worksheet.col_values(2)]
 
-        if str(discord_id) in existing_discord_ids:
+    def __init__(self, worksheet_name, create_if_missing=False):
+        self.worksheet_name = worksheet_name
+        self.create_if_missing = create_if_missing
+        self.worksheet = None
+        # Maps Discord ID (as a string) to {"row": sheet row number, "username": ..., "steam_id": Steam ID or None}.
+        self.directory = None
+        self.directory_loaded_at = 0
+        self.directory_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self.write_queue = SheetWriteQueue(self)
+
+    def get_worksheet(self):
+        """
+        Returns the worksheet object, opening (and for guild sheets, creating) it on first use.
+        Returns None on failure.
+        """
+        if self.worksheet:
+            return self.worksheet
+
+        with self._connect_lock:
+            if self.worksheet:
+                return self.worksheet
+            spreadsheet = _get_spreadsheet()
+            if not spreadsheet:
+                return None
+            try:
+                self.worksheet = spreadsheet.worksheet(self.worksheet_name)
+                print(f"[Sheets Manager] Successfully connected to Google Sheet: '{self.worksheet_name}'")
+            except WorksheetNotFound:
+                if not self.create_if_missing:
+                    print(f"[Sheets Manager] CRITICAL ERROR: Worksheet '{self.worksheet_name}' not found in the spreadsheet. "
+                          "Please double-check the WORKSHEET_NAME in sheets_manager.py (case-sensitive!).")
+                    return None
+                try:
+                    worksheet = _with_backoff(
+                        lambda: spreadsheet.add_worksheet(self.worksheet_name, rows=100, cols=len(MEMBER_SHEET_HEADER)),
+                        "add_worksheet"
+                    )
+                    _with_backoff(lambda: worksheet.append_row(MEMBER_SHEET_HEADER), "append_row")
+                except Exception as e:
+                    print(f"[Sheets Manager] ERROR: Could not create worksheet '{self.worksheet_name}': {e}")
+                    return None
+                print(f"[Sheets Manager] Created worksheet '{self.worksheet_name}'.")
+                if _worksheet_titles is not None:
+                    _worksheet_titles.add(self.worksheet_name)
+                self.worksheet = worksheet
+            except Exception as e:
+                print(f"[Sheets Manager] ERROR: Could not open worksheet '{self.worksheet_name}': {type(e).__name__}: {e}")
+                return None
+            return self.worksheet
+
+    def exists(self):
+        """
+        Returns True if the worksheet is open or listed in the spreadsheet (without creating it),
+        False if it is not, or None if that cannot be told right now.
+        """
+        if self.worksheet:
+            return True
+        titles = get_worksheet_titles()
+        if titles is None:
+            return None
+        return self.worksheet_name in titles
+
+    def refresh_directory(self):
+        """
+        Reloads the in-memory member directory with a single bulk read of the worksheet.
+        Assumes row 1 is the header, 'Discord ID' is column 2 and 'Steam ID' is column 3.
+        Returns True on success, False if the sheet could not be read (the previous directory is kept).
+        """
+        worksheet = self.get_worksheet()
+        if not worksheet:
+            print("Warning: Google Sheet connection not established. Cannot load member directory.")
+            return False
+
+        try:
+            with metrics.timed("sheets", "get_all_values"):
+                rows = worksheet.get_all_values()
+        except Exception as e:
+            print(f"[Sheets Manager] ERROR: Failed to load member directory from '{self.worksheet_name}': {e}")
+            return False
+
+        directory = {}
+        for row_number, row in enumerate(rows[1:], start=2):
+            discord_id = row[1].strip() if len(row) > 1 else ""
+            if not discord_id:
+                continue
+            steam_id = row[2].strip() if len(row) > 2 else ""
+            directory[discord_id] = {"row": row_number, "username": row[0], "steam_id": steam_id or None}
+
+        self.write_queue.overlay(directory)
+        self.directory = directory
+        self.directory_loaded_at = time.monotonic()
+        print(f"[Sheets Manager] Member directory '{self.worksheet_name}' loaded with {len(directory)} member(s).")
+        return True
+
+    def get_directory(self):
+        """
+        Returns the in-memory member directory, refreshing it if it is older than MEMBER_DIRECTORY_TTL.
+        Returns None if the directory has never been loaded successfully.
+        """
+        if self.directory is None or time.monotonic() - self.directory_loaded_at > MEMBER_DIRECTORY_TTL:
+            with self.directory_lock:
+                if self.directory is None or time.monotonic() - self.directory_loaded_at > MEMBER_DIRECTORY_TTL:
+                    self.refresh_directory()
+        return self.directory
+
+    def invalidate_directory(self):
+        self.directory_loaded_at = 0
+
+    def get_directory_snapshot(self, refresh=False):
+        if refresh:
+            with self.directory_lock:
+                self.refresh_directory()
+        directory = self.get_directory()
+        if directory is None:
+            return None
+        return {discord_id: dict(entry) for discord_id, entry in directory.items()}
+
+    def get_all_members_data(self):
+        worksheet = self.get_worksheet()
+        if worksheet:
+            try:
+                with metrics.timed("sheets", "get_all_records"):
+                    return worksheet.get_all_records()
+            except Exception as e:
+                print(f"Error fetching records: {e}")
+                return []
+        else:
+            print("Warning: Google Sheet connection not established. Cannot fetch records.")
+        return []
+
+    def add_new_discord_user(self, username, discord_id):
+        directory = self.get_directory()
+        if directory is None:
+            return False, "Could not load the member directory from the Google Sheet."
+
+        if str(discord_id) in directory:
             return False, f"User '{username}' (ID: {discord_id}) already exists in the sheet."
 
-        new_row = [username, str(discord_id), ""]
-        worksheet.append_row(new_row)
-        return True, f"User '{username}' (ID: {discord_id}) added successfully."
+        directory[str(discord_id)] = {"row": None, "username": username, "steam_id": None}
+        self.write_queue.enqueue_append(username, discord_id)
+        return True, f"User '{username}' (ID: {discord_id}) queued to be added."
 
-    except Exception as e:
-        return False, f"Error adding user to sheet: {e}"
+    def get_member_ids(self):
+        directory = self.get_directory()
+        if directory is None:
+            return None
+        return set(directory)
+
+    def add_new_discord_users(self, members):
+        directory = self.get_directory()
+        if directory is None:
+            return False, "Could not load the member directory from the Google Sheet."
+
+        added = 0
+        for username, discord_id in members:
+            if str(discord_id) in directory:
+                continue
+            directory[str(discord_id)] = {"row": None, "username": username, "steam_id": None}
+            self.write_queue.enqueue_append(username, discord_id)
+            added += 1
+        return True, f"{added} user(s) queued to be added."
+
+    def get_steam_id_for_discord_id(self, discord_id):
+        directory = self.get_directory()
+        if directory is None:
+            print("Warning: Member directory not available. Cannot get Steam ID.")
+            return None
+
+        entry = directory.get(str(discord_id))
+        if entry is None:
+            print(f"Discord ID {discord_id} not found in sheet.")
+            return None
+        return entry["steam_id"]
+
+    def update_user_steam_id(self, discord_id, new_steam_id):
+        directory = self.get_directory()
+        if directory is None:
+            return False, "Could not load the member directory from the Google Sheet."
+
+        entry = directory.get(str(discord_id))
+        if not entry:
+            return False, f"Discord ID {discord_id} not found in the sheet."
+
+        entry["steam_id"] = new_steam_id
+        self.write_queue.enqueue_steam_id_update(discord_id, new_steam_id)
+        return True, f"Steam ID for Discord user {discord_id} updated successfully."
 
 
-def get_steam_id_for_discord_id(discord_id):
+# Maps guild ID (None for the default sheet) to its MemberSheet.
+_member_sheets = {}
+_member_sheets_lock = threading.Lock()
+
+
+def get_member_sheet(guild_id=None):
     """
-    Retrieves the Steam ID for a given Discord ID from the sheet.
-    Assumes 'Discord ID' is column 2 and 'Steam ID' is column 3.
-    Returns the Steam ID string or None if not found/error.
+    Returns the MemberSheet for a guild, or the default sheet if guild_id is None.
     """
-    worksheet = _get_worksheet()
-    if not worksheet:
-        print("Warning: Google Sheet connection not established. Cannot get Steam ID.")
-        return None
+    key = str(guild_id) if guild_id is not None else None
+    sheet = _member_sheets.get(key)
+    if sheet is None:
+        with _member_sheets_lock:
+            sheet = _member_sheets.get(key)
+            if sheet is None:
+                if key is None:
+                    sheet = MemberSheet(WORKSHEET_NAME)
+                else:
+                    sheet = MemberSheet(GUILD_WORKSHEET_FORMAT.format(sheet_name=WORKSHEET_NAME, guild_id=key),
+                                        create_if_missing=True)
+                _member_sheets[key] = sheet
+    return sheet
 
-    try:
-        cell = worksheet.find(str(discord_id), in_column=2)
-        if cell:
-            steam_id = worksheet.cell(cell.row, 3).value
-            return steam_id if steam_id else None
-    except gspread.exceptions.CellNotFound:
-        print(f"Discord ID {discord_id} not found in sheet.")
-        return None
-    except Exception as e:
-        print(f"ERROR: Failed to retrieve Steam ID for {discord_id}: {e}")
-        return None
-    return None
+
+def warm_up():
+    """
+    Authenticates with Google and opens the default worksheet ahead of the first command.
+    Blocking; call it from a worker thread when running inside the event loop.
+    Returns True if the worksheet is ready.
+    """
+    return get_member_sheet().get_worksheet() is not None
+
+
+def refresh_member_directory(guild_id=None):
+    """
+    Reloads a sheet's in-memory member directory with a single bulk read.
+    Returns True on success, False if the sheet could not be read (the previous directory is kept).
+    """
+    return get_member_sheet(guild_id).refresh_directory()
+
+
+def get_member_directory_snapshot(refresh=False, guild_id=None):
+    """
+    Returns a copy of the member directory ({discord_id: {"row", "username", "steam_id"}}) including
+    writes that are still queued. Pass refresh=True to re-read the sheet first.
+    Returns None if the sheet could not be read.
+    """
+    return get_member_sheet(guild_id).get_directory_snapshot(refresh=refresh)
 
 
-def update_user_steam_id(discord_id, new_steam_id):
+def flush_pending_writes():
+    """
+    Flushes every sheet's write-behind queue to the Google Sheet.
+    Blocking; call it from a worker thread when running inside the event loop.
+    Returns True if every pending write was applied.
+    """
+    drained = True
+    for sheet in list(_member_sheets.values()):
+        drained = sheet.write_queue.flush() and drained
+    return drained
+
+
+def add_written_listener(callback, guild_id=None):
+    """
+    Registers callback({discord_id: steam_id}), called whenever queued writes for a guild's sheet reach the sheet.
+    """
+    get_member_sheet(guild_id).write_queue.add_written_listener(callback)
+
+
+def has_pending_write(discord_id, guild_id=None):
+    """
+    Returns True if a write for `discord_id` to a guild's sheet has not been confirmed yet.
+    """
+    return get_member_sheet(guild_id).write_queue.has_pending(discord_id)
+
+
+def guild_sheet_exists(guild_id=None):
+    """
+    Returns True if a guild's worksheet exists, False if it does not, or None if the spreadsheet is unavailable.
+    """
+    return get_member_sheet(guild_id).exists()
+
+
+def get_pending_write_count():
+    """
+    Returns the number of queued writes that have not reached the Google Sheet yet, across all sheets.
+    """
+    return sum(sheet.write_queue.depth() for sheet in list(_member_sheets.values()))
+
+
+def get_all_members_data(guild_id=None):
+    """
+    Fetches all records from the worksheet and returns a list of dictionaries.
+    """
+    return get_member_sheet(guild_id).get_all_members_data()
+
+
+def add_new_discord_user(username, discord_id, guild_id=None):
+    """
+    Adds a new user to the Google Sheet if they are not already present.
+    The row is queued and written by the next flush_pending_writes().
+    """
+    return get_member_sheet(guild_id).add_new_discord_user(username, discord_id)
+
+
+def get_member_ids(guild_id=None):
+    """
+    Returns the set of Discord IDs (as strings) in a sheet, including queued additions, or None if unavailable.
+    """
+    return get_member_sheet(guild_id).get_member_ids()
+
+
+def add_new_discord_users(members, guild_id=None):
+    """
+    Queues every (username, discord_id) pair not already in the sheet; they are written by the next
+    flush_pending_writes() as a single append.
+    Returns (True, message) on success, (False, message) on failure.
+    """
+    return get_member_sheet(guild_id).add_new_discord_users(members)
+
+
+def get_steam_id_for_discord_id(discord_id, guild_id=None):
+    """
+    Retrieves the Steam ID for a given Discord ID from the in-memory member directory.
+    Returns the Steam ID string or None if not found/error.
+    """
+    return get_member_sheet(guild_id).get_steam_id_for_discord_id(discord_id)
+
+
+def update_user_steam_id(discord_id, new_steam_id, guild_id=None):
     """
     Updates the Steam ID for a given Discord user in the Google Sheet.
+    The change is visible to lookups immediately and written by the next flush_pending_writes().
     Returns (True, message) on success, (False, message) on failure.
     """
-    worksheet = _get_worksheet()
-    if not worksheet:
-        return False, "Google Sheet connection not established."
-    
-    try:
-        cell = worksheet.find(str(discord_id), in_column=2)
-        if cell:
-            worksheet.update_cell(cell.row, 3, new_steam_id)
-            return True, f"Steam ID for Discord user {discord_id} updated successfully."
-        else:
-            return False, f"Discord ID {discord_id} not found in the sheet."
-    except Exception as e:
-        return False, f"Error updating Steam ID for user {discord_id}: {e}"
\ No newline at end of file
+    return get_member_sheet(guild_id).update_user_steam_id(discord_id, new_steam_id)
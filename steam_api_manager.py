@@ -1,103 +1,725 @@
-import requests
+import asyncio
+import contextvars
 import os
 import time
+from array import array
+from contextlib import contextmanager
+
+import aiohttp
+
+import app_catalog
+import cache_manager
+import metrics
 
 
 STEAM_API_KEY = os.getenv('STEAM_API_KEY')
 STEAM_API_BASE_URL = "https://api.steampowered.com/"
+STEAM_STORE_API_URL = "https://store.steampowered.com/api/"
+STEAM_HEADER_IMAGE_URL = "https://cdn.akamai.steamstatic.com/steam/apps/{appid}/header.jpg"
+
+STORE_API_RATE = float(os.getenv('STEAM_STORE_API_RATE', 4))
+STORE_API_BURST = int(os.getenv('STEAM_STORE_API_BURST', 4))
+WEB_API_RATE = float(os.getenv('STEAM_WEB_API_RATE', 10))
+WEB_API_BURST = int(os.getenv('STEAM_WEB_API_BURST', 10))
+# Requests one guild may have queued on an endpoint's rate limiter at once. The limiter serves waiters in arrival
+# order, so under contention guilds take turns (one busy guild cannot starve the others), while a guild alone
+# still keeps the limiter saturated and gets the endpoint's full rate.
+GUILD_QUEUE_DEPTH = int(os.getenv('STEAM_GUILD_QUEUE_DEPTH', 2))
+MAX_THROTTLE_BACKOFF = 60
+MAX_THROTTLE_RETRIES = 3
+# Consecutive failures (network errors, timeouts, 5xx, exhausted 429 retries) that open an endpoint's circuit,
+# and how long it stays open before one trial request is let through.
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('STEAM_CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('STEAM_CIRCUIT_RESET_TIMEOUT', 30))
+# Only ask the store for the sections the bot reads: 'basic' carries name and header_image.
+APP_DETAILS_FILTERS = "basic,categories"
+REQUEST_TIMEOUT = float(os.getenv('STEAM_REQUEST_TIMEOUT', 10))
+CONNECTION_POOL_SIZE = int(os.getenv('STEAM_CONNECTION_POOL_SIZE', 20))
+
+
+class GameInfo:
+    """
+    Compact record of the only appdetails fields the bot uses.
+    """
+
+    __slots__ = ("appid", "name", "header_image", "category_mask")
+
+    def __init__(self, appid, name=None, header_image=None, category_mask=0):
+        self.appid = int(appid)
+        self.name = name
+        self.header_image = header_image
+        self.category_mask = category_mask
 
-LAST_STORE_API_CALL_TIME = 0
-STORE_API_COOLDOWN = 0.25
+    @classmethod
+    def from_appdetails(cls, appid, data):
+        """
+        Builds a GameInfo from a store appdetails `data` object, or from a cached record of one.
+        """
+        return cls(
+            appid,
+            name=data.get("name"),
+            header_image=data.get("header_image"),
+            category_mask=cache_manager.category_mask_from_details(data),
+        )
 
+    def to_record(self):
+        """
+        Returns the dictionary stored in the app-details cache.
+        """
+        return {"name": self.name, "header_image": self.header_image, "category_mask": self.category_mask}
 
-def _wait_for_store_api_cooldown():
-    global LAST_STORE_API_CALL_TIME
-    time_since_last_call = time.time() - LAST_STORE_API_CALL_TIME
-    if time_since_last_call < STORE_API_COOLDOWN:
-        time.sleep(STORE_API_COOLDOWN - time_since_last_call)
-    LAST_STORE_API_CALL_TIME = time.time()
+    @property
+    def display_name(self):
+        return self.name or f"Unknown Game (AppID: {self.appid})"
 
+    @property
+    def is_multiplayer(self):
+        return bool(self.category_mask & cache_manager.MULTIPLAYER_CATEGORY_MASK)
 
-def get_owned_games(steam_id):
+    def __repr__(self):
+        return f"GameInfo(appid={self.appid}, name={self.name!r})"
+
+
+class RateLimiter:
     """
-    Fetches the list of games owned by a given SteamID.
-    Requires the Steam profile to be public.
-    Returns a dictionary with game app IDs and names, or None on error/ private profile.
+    Token-bucket rate limiter for one Steam endpoint family.
+    Allows bursts of up to `burst` requests and a sustained `rate` requests per second.
+    Waiters are served in arrival order (asyncio.Lock is FIFO), so concurrent commands share the budget fairly.
+    After a 429/503 the bucket is drained and blocked for Retry-After seconds, or an exponentially growing backoff.
     """
-    if not STEAM_API_KEY:
-        print("Steam API key is not set.")
-        return None
-    
-    url = f"{STEAM_API_BASE_URL}IPlayerService/GetOwnedGames/v1/"
-    params = {
-        'key': STEAM_API_KEY,
-        'steamid': steam_id,
-        'include_appinfo': 1,
-        'format': 'json'
-    }
 
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0
+        self._backoff = 0
+        self._lock = asyncio.Lock()
+        self.requests = 0
+        self.waits = 0
+        self.throttled = 0
+        self.total_wait_time = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """
+        Waits until a request may be sent under this limiter.
+        """
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+        waited = time.monotonic() - start
+        self.requests += 1
+        if waited > 0.001:
+            self.waits += 1
+            self.total_wait_time += waited
+
+    def busy(self):
+        """
+        Returns True while requests are queued waiting on this limiter.
+        """
+        return self._lock.locked()
+
+    def on_throttled(self, retry_after=None):
+        """
+        Records a 429/503 response and blocks the bucket until the server-requested or backoff delay has passed.
+        """
+        self.throttled += 1
+        self._backoff = min(MAX_THROTTLE_BACKOFF, self._backoff * 2 if self._backoff else 1)
+        delay = retry_after if retry_after is not None else self._backoff
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + delay)
+        self._tokens = 0
+        self._updated = now
+        print(f"[Steam API] {self.name} rate limited; pausing requests for {delay:.1f}s.")
+
+    def on_success(self):
+        self._backoff = 0
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "waits": self.waits,
+            "throttled": self.throttled,
+            "total_wait_time": self.total_wait_time,
+            "avg_wait_time": self.total_wait_time / self.requests if self.requests else 0.0,
+        }
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    """
+    Raised instead of sending a request while an endpoint's circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one Steam endpoint family.
+    After `failure_threshold` consecutive failures the circuit opens and requests fail immediately for
+    `reset_timeout` seconds; then a single trial request is let through, and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def is_open(self):
+        return self._opened_at is not None
+
+    def retry_in(self):
+        """
+        Returns how many seconds remain until the next trial request is allowed (0 when closed).
+        """
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        """
+        Returns True if a request may be sent now.
+        """
+        if self._opened_at is None:
+            return True
+        if not self._trial_in_flight and self.retry_in() == 0:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def on_success(self):
+        if self._opened_at is not None:
+            print(f"[Steam API] {self.name} circuit closed; Steam is answering again.")
+        self.consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def on_failure(self):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+            if self._opened_at is None:
+                self.times_opened += 1
+                print(f"[Steam API] {self.name} circuit opened after {self.consecutive_failures} failures; "
+                      f"failing fast for {self.reset_timeout:.0f}s.")
+            self._opened_at = time.monotonic()
+
+    def on_abandoned(self):
+        """
+        Frees the trial slot when a request ends without a verdict (e.g. it was cancelled).
+        """
+        self._trial_in_flight = False
+
+    def stats(self):
+        return {
+            "open": self.is_open(),
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+def _parse_retry_after(value):
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        if data and "response" in data and "games" in data["response"]:
-            games_list = data["response"]["games"]
-            owned_games = {game["appid"]: game["name"] for game in games_list}
-            return owned_games
-        else:
-            print(f"Steam API: No games found or private profile for SteamID {steam_id}.")
-            return {}
-    except requests.exceptions.HTTPError as http_err:
-        if response.status_code == 401:
-            print(f"Steam API Error for {steam_id}: Unauthorized. Check your API key.")
-        elif response.status_code == 403:
-            print(f"Steam API Error for {steam_id}: Forbidden. Profile might be private or API key restricted.")
-        else:
-            print(f"Steam API HTTP error for {steam_id}: {http_err}")
-        return None
-    except requests.exceptions.RequestException as req_err:
-        print(f"Steam API Request error for {steam_id}: {req_err}")
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
         return None
-    except ValueError as json_err:
-        print(f"Steam API JSON decoding error for {steam_id}: {json_err}. Response: {response.text[:200]}...")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one in-flight task.
+    Every caller waiting on a key receives the leader's result or exception.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    async def do(self, key, coroutine_function):
+        """
+        Runs coroutine_function() for `key`, or joins the call already running for it.
+        """
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coroutine_function())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.deduplicated += 1
+        # Shield the shared task so one caller being cancelled does not cancel it for the others.
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"calls": self.calls, "deduplicated": self.deduplicated, "in_flight": len(self._in_flight)}
+
+
+class GuildBudget:
+    """
+    One guild's share of the shared Steam rate limiters: at most GUILD_QUEUE_DEPTH queued requests per endpoint.
+    """
+
+    def __init__(self, guild_id, queue_depth=GUILD_QUEUE_DEPTH):
+        self.guild_id = guild_id
+        self.queue_depth = queue_depth
+        self._slots = {}
+        self.requests = 0
+        self.total_wait_time = 0.0
+
+    async def acquire(self, limiter):
+        """
+        Waits for one of the guild's queue slots, then for the shared limiter.
+        """
+        slots = self._slots.get(limiter.name)
+        if slots is None:
+            slots = self._slots[limiter.name] = asyncio.Semaphore(self.queue_depth)
+        start = time.monotonic()
+        async with slots:
+            await limiter.acquire()
+        self.requests += 1
+        self.total_wait_time += time.monotonic() - start
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "total_wait_time": self.total_wait_time,
+            "avg_wait_time": self.total_wait_time / self.requests if self.requests else 0.0,
+        }
+
+
+# Budget of the guild whose command is running; set with guild_budget() and inherited by the tasks it starts.
+_current_guild_budget = contextvars.ContextVar("steam_guild_budget", default=None)
+
+
+class SteamClient:
+    """
+    Asyncio Steam client built on aiohttp.
+    Keeps one shared keep-alive connection pool for the Web API and the Store API,
+    applies a per-request timeout and rate-limits each endpoint family without blocking the event loop.
+    """
+
+    def __init__(self, api_key=None, timeout=REQUEST_TIMEOUT, pool_size=CONNECTION_POOL_SIZE,
+                 app_cache=None, library_cache=None, category_index=None):
+        self.api_key = api_key or STEAM_API_KEY
+        self.app_cache = app_cache
+        self.library_cache = library_cache
+        self.category_index = category_index
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.pool_size = pool_size
+        self._session = None
+        self.rate_limiters = {
+            "store": RateLimiter("store", STORE_API_RATE, STORE_API_BURST),
+            "web": RateLimiter("web", WEB_API_RATE, WEB_API_BURST),
+        }
+        self.circuit_breakers = {
+            "store": CircuitBreaker("store"),
+            "web": CircuitBreaker("web"),
+        }
+        self.single_flight = SingleFlight()
+        self.guild_budgets = {}
+
+    async def get_session(self):
+        """
+        Returns the shared aiohttp session, creating it on first use.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def warm_up(self):
+        """
+        Creates the session and opens keep-alive connections to the Web API and Store API hosts,
+        so the first command after a restart does not pay for DNS and TLS handshakes.
+        """
+        session = await self.get_session()
+        urls = (STEAM_API_BASE_URL + "ISteamWebAPIUtil/GetServerInfo/v1/", STEAM_STORE_API_URL + "appdetails")
+        results = await asyncio.gather(*(session.head(url) for url in urls), return_exceptions=True)
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                print(f"[Steam API] Could not pre-connect to {url}: {type(result).__name__}: {result}")
+            else:
+                result.release()
+
+    async def close(self):
+        """
+        Closes the shared session and its connection pool.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _get_json(self, url, params=None, endpoint="web", metric_name=None):
+        """
+        Performs a rate-limited GET request through the endpoint's circuit breaker and returns the decoded JSON body.
+        Raises CircuitOpenError without sending anything while the circuit is open,
+        and aiohttp.ClientResponseError on HTTP errors.
+        """
+        breaker = self.circuit_breakers[endpoint]
+        if not breaker.allow():
+            raise CircuitOpenError(f"{endpoint} circuit open; retrying in {breaker.retry_in():.0f}s")
+        try:
+            data = await self._request_json(url, params, endpoint, metric_name)
+        except aiohttp.ClientResponseError as e:
+            if e.status >= 500 or e.status == 429:
+                breaker.on_failure()
+            else:
+                breaker.on_success()
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            breaker.on_failure()
+            raise
+        except BaseException:
+            breaker.on_abandoned()
+            raise
+        breaker.on_success()
+        return data
+
+    async def _request_json(self, url, params, endpoint, metric_name):
+        """
+        Sends the GET request under the endpoint's rate limiter, queued through the current guild's budget if any.
+        Each attempt is recorded in the metrics registry under ("steam", metric_name).
+        Retries 429/503 responses after the limiter's backoff, up to MAX_THROTTLE_RETRIES times.
+        """
+        limiter = self.rate_limiters[endpoint]
+        session = await self.get_session()
+        budget = _current_guild_budget.get()
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            if budget is not None:
+                await budget.acquire(limiter)
+            else:
+                await limiter.acquire()
+            with metrics.timed("steam", metric_name or endpoint) as timer:
+                async with session.get(url, params=params) as response:
+                    if response.status >= 400:
+                        timer.failed = True
+                    if response.status in (429, 503) and attempt < MAX_THROTTLE_RETRIES:
+                        limiter.on_throttled(_parse_retry_after(response.headers.get("Retry-After")))
+                        continue
+                    response.raise_for_status()
+                    limiter.on_success()
+                    return await response.json(content_type=None)
+
+    def rate_limit_stats(self):
+        """
+        Returns per-endpoint-family limiter statistics, including time spent waiting.
+        """
+        return {name: limiter.stats() for name, limiter in self.rate_limiters.items()}
+
+    def circuit_breaker_stats(self):
+        return {name: breaker.stats() for name, breaker in self.circuit_breakers.items()}
+
+    def get_guild_budget(self, guild_id):
+        """
+        Returns the guild's GuildBudget, through which its requests queue for the shared endpoint limiters.
+        """
+        budget = self.guild_budgets.get(guild_id)
+        if budget is None:
+            budget = self.guild_budgets[guild_id] = GuildBudget(guild_id)
+        return budget
+
+    async def _fetch_owned_games(self, steam_id, include_appinfo):
+        """
+        Calls IPlayerService/GetOwnedGames for a SteamID.
+        Returns the raw list of game entries, an empty list for a private profile or empty library, or None on error.
+        """
+        if not self.api_key:
+            print("Steam API key is not set.")
+            return None
+
+        url = f"{STEAM_API_BASE_URL}IPlayerService/GetOwnedGames/v1/"
+        params = {
+            'key': self.api_key,
+            'steamid': steam_id,
+            'include_appinfo': 1 if include_appinfo else 0,
+            'format': 'json'
+        }
+
+        try:
+            data = await self._get_json(url, params, metric_name="GetOwnedGames")
+
+            if data and "response" in data and "games" in data["response"]:
+                return data["response"]["games"]
+            else:
+                print(f"Steam API: No games found or private profile for SteamID {steam_id}.")
+                return []
+        except aiohttp.ClientResponseError as http_err:
+            if http_err.status == 401:
+                print(f"Steam API Error for {steam_id}: Unauthorized. Check your API key.")
+            elif http_err.status == 403:
+                print(f"Steam API Error for {steam_id}: Forbidden. Profile might be private or API key restricted.")
+            else:
+                print(f"Steam API HTTP error for {steam_id}: {http_err}")
+            return None
+        except CircuitOpenError:
+            return None
+        except asyncio.TimeoutError:
+            print(f"Steam API Request error for {steam_id}: timed out after {self.timeout.total}s.")
+            return None
+        except aiohttp.ClientError as req_err:
+            print(f"Steam API Request error for {steam_id}: {req_err}")
+            return None
+        except ValueError as json_err:
+            print(f"Steam API JSON decoding error for {steam_id}: {json_err}.")
+            return None
+
+    async def get_owned_appids(self, steam_id, refresh=False):
+        """
+        Fetches the appids owned by a given SteamID as a sorted array('I'), without names.
+        Reads from the library cache first when one is configured, unless `refresh` is set.
+        Returns an empty array for a private profile or empty library, or None on error.
+        """
+        library = await self.get_library(steam_id, refresh=refresh)
+        return library[0] if library is not None else None
+
+    async def get_library(self, steam_id, refresh=False):
+        """
+        Fetches a SteamID's library as (appids, playtime_forever, playtime_2weeks): a sorted array('I') of appids
+        and two aligned arrays of playtime in minutes.
+        Reads from the library cache first when one is configured, unless `refresh` is set.
+        Returns empty arrays for a private profile or empty library, or None on error.
+        """
+        if self.library_cache is not None and not refresh:
+            library = self.library_cache.get_playtimes(steam_id)
+            if library is not None:
+                return library
+
+        return await self.single_flight.do(("owned_appids", str(steam_id)), lambda: self._fetch_library(steam_id))
+
+    async def _fetch_library(self, steam_id):
+        games_list = await self._fetch_owned_games(steam_id, include_appinfo=False)
+        if games_list is None:
+            return None
+        appids = [game["appid"] for game in games_list]
+        playtime_forever = [game.get("playtime_forever", 0) for game in games_list]
+        playtime_2weeks = [game.get("playtime_2weeks", 0) for game in games_list]
+        if self.library_cache is not None and games_list:
+            self.library_cache.put(steam_id, appids, playtime_forever=playtime_forever, playtime_2weeks=playtime_2weeks)
+            return self.library_cache.get_playtimes(steam_id, allow_stale=True)
+        rows = sorted(dict(zip(appids, zip(playtime_forever, playtime_2weeks))).items())
+        return (array('I', (appid for appid, _ in rows)),
+                array('I', (playtimes[0] for _, playtimes in rows)),
+                array('I', (playtimes[1] for _, playtimes in rows)))
+
+    async def get_game_details(self, appid):
+        """
+        Fetches basic details for a specific game from the Steam Store API.
+        Used to get game names if only appids are aviailable or for more info.
+        Returns a GameInfo, or None if the store has no data for the app or the request failed.
+        Reads from the app-details cache first when one is configured, and feeds the category index.
+        """
+        if self.app_cache is not None:
+            found, record = self.app_cache.get(appid)
+            if found:
+                if record is None:
+                    return None
+                game = GameInfo.from_appdetails(appid, record)
+                if self.category_index is not None and self.category_index.get(appid) is None:
+                    self.category_index.update_mask(appid, game.category_mask)
+                return game
+
+        return await self.single_flight.do(("appdetails", int(appid)), lambda: self._fetch_game_details(appid))
+
+    def get_cached_library(self, steam_id):
+        """
+        Returns the last cached (appids, playtime_forever, playtime_2weeks) for a SteamID even if it has expired,
+        or None if there is none.
+        """
+        if self.library_cache is None:
+            return None
+        return self.library_cache.get_playtimes(steam_id, allow_stale=True)
+
+    def get_cached_game_details(self, appid):
+        """
+        Returns the last cached GameInfo for an app even if it has expired, or None if there is none.
+        """
+        if self.app_cache is None:
+            return None
+        found, record = self.app_cache.get(appid, allow_stale=True)
+        if not found or record is None:
+            return None
+        return GameInfo.from_appdetails(appid, record)
+
+    async def _fetch_game_details(self, appid):
+        url = f"{STEAM_STORE_API_URL}appdetails"
+        params = {'appids': appid, 'filters': APP_DETAILS_FILTERS}
+        try:
+            data = await self._get_json(url, params, endpoint="store", metric_name="appdetails")
+            game = None
+            if data and str(appid) in data and data[str(appid)]["success"]:
+                game = GameInfo.from_appdetails(appid, data[str(appid)]["data"])
+            if self.app_cache is not None and data and str(appid) in data:
+                self.app_cache.put(appid, game.to_record() if game else None)
+            if game and self.category_index is not None:
+                self.category_index.update_mask(appid, game.category_mask)
+            return game
+        except CircuitOpenError:
+            return None
+        except asyncio.TimeoutError:
+            print(f"Error fetching game details for AppID {appid}: timed out after {self.timeout.total}s.")
+            return None
+        except aiohttp.ClientError as e:
+            print(f"Error fetching game details for AppID {appid}: {e}")
+            return None
+        except ValueError as e:
+            print(f"JSON decoding error for AppID {appid}: {e}")
+            return None
+
+
+_client = None
+
+
+def get_client():
+    """
+    Returns the process-wide SteamClient, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        _client = SteamClient(
+            app_cache=cache_manager.get_app_details_cache(),
+            library_cache=cache_manager.get_library_cache(),
+            category_index=cache_manager.get_category_index(),
+        )
+    return _client
+
+
+async def warm_up():
+    """
+    Opens the process-wide SteamClient's connection pool ahead of the first command.
+    """
+    await get_client().warm_up()
+
+
+async def close_client():
+    """
+    Closes the process-wide SteamClient's connection pool.
+    """
+    if _client is not None:
+        await _client.close()
+
+
+def get_single_flight_stats():
+    """
+    Returns how many Steam lookups were coalesced into an already in-flight request.
+    """
+    return get_client().single_flight.stats()
+
+
+def get_rate_limit_stats():
+    """
+    Returns rate limiter statistics for the store and Web API endpoint families.
+    """
+    return get_client().rate_limit_stats()
+
+
+def get_circuit_breaker_stats():
+    """
+    Returns circuit breaker state for the store and Web API endpoint families.
+    """
+    return get_client().circuit_breaker_stats()
+
+
+def is_endpoint_available(endpoint):
+    """
+    Returns False while the endpoint family's circuit breaker is open.
+    """
+    return not get_client().circuit_breakers[endpoint].is_open()
+
+
+def get_cached_library(steam_id):
+    """
+    Returns the last cached (appids, playtime_forever, playtime_2weeks) for a SteamID, however old,
+    without contacting Steam. None if never cached.
+    """
+    return get_client().get_cached_library(steam_id)
+
+
+def get_cached_game_details(appid):
+    """
+    Returns the last cached GameInfo for an app, however old, without contacting Steam. None if never cached.
+    """
+    return get_client().get_cached_game_details(appid)
+
+
+def get_catalog_game_info(appid):
+    """
+    Builds a GameInfo from the local app catalog and category index, without contacting Steam.
+    The header image uses Steam's standard CDN path. Returns None if the app is not in the catalog.
+    """
+    name = app_catalog.get_app_catalog().name(appid)
+    if name is None:
         return None
-    
+    return GameInfo(
+        appid,
+        name=name,
+        header_image=STEAM_HEADER_IMAGE_URL.format(appid=int(appid)),
+        category_mask=cache_manager.get_category_index().get(appid) or 0,
+    )
 
-def get_game_details(appid):
+
+def get_guild_budget_stats():
     """
-    Fetches basic details for a specific game from the Steam Store API.
-    Used to get game names if only appids are aviailable or for more info.
+    Returns per-guild budget statistics, keyed by guild ID.
     """
-    _wait_for_store_api_cooldown()
+    return {guild_id: budget.stats() for guild_id, budget in get_client().guild_budgets.items()}
+
 
-    url = f"https://store.steampowered.com/api/appdetails?appids={appid}"
+@contextmanager
+def guild_budget(guild_id):
+    """
+    Queues Steam requests made inside the block, and by tasks started from it, through the guild's own budget.
+    Requests made outside any guild (e.g. by the cache warmer) only use the shared limiters.
+    """
+    budget = get_client().get_guild_budget(guild_id) if guild_id is not None else None
+    token = _current_guild_budget.set(budget)
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        if data and str(appid) in data and data[str(appid)]["success"]:
-            return data[str(appid)]["data"]
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching game details for AppID {appid}: {e}")
-        return None
-    except ValueError as e:
-        print(f"JSON decoding error for AppID {appid}: {e}")
-        return None
-    
+        yield budget
+    finally:
+        _current_guild_budget.reset(token)
 
-def is_game_multiplayer(appid):
+
+async def get_owned_appids(steam_id, refresh=False):
     """
-    Checks if a game is categorized as multiplayer, co-op, or MMO.
+    Fetches the appids owned by a given SteamID as a sorted array('I'), served from the library cache when fresh.
+    Pass refresh=True to bypass the cache and re-fetch.
+    Returns an empty array for a private profile, or None on error.
     """
-    details = get_game_details(appid)
-    if not details:
-        return False
-    
-    if "categories" in details:
-        for category in details["categories"]:
-            desc = category.get("description", "").lower()
-            if "multiplayer" in desc or "multi-player" in desc or "co-op" in desc or "mmo" in desc:
-                return True
-    return False
\ No newline at end of file
+    return await get_client().get_owned_appids(steam_id, refresh=refresh)
+
+
+async def get_library(steam_id, refresh=False):
+    """
+    Fetches a SteamID's library as (appids, playtime_forever, playtime_2weeks) arrays, served from the library cache
+    when fresh. Pass refresh=True to bypass the cache and re-fetch.
+    Returns empty arrays for a private profile, or None on error.
+    """
+    return await get_client().get_library(steam_id, refresh=refresh)
+
+
+async def get_game_details(appid):
+    """
+    Fetches basic details for a specific game from the Steam Store API as a GameInfo, or None.
+    """
+    return await get_client().get_game_details(appid)
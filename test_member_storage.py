@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import member_storage
+import sheets_manager
+from fake_sheets import FakeWorksheet
+
+
+GUILD_ID = 4242
+DISCORD_ID = 1001
+STEAM_ID = "76561190000000001"
+
+
+class SheetsMirrorRoundTripTest(unittest.TestCase):
+    """
+    The SQLite store is primary: a Steam ID linked locally must survive a restart before the sheet write lands.
+    """
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.saved = (member_storage.MEMBER_DB_PATH, member_storage.MEMBER_DB_DIR,
+                      dict(member_storage._stores), dict(sheets_manager._member_sheets))
+        member_storage.MEMBER_DB_PATH = os.path.join(self.db_dir, "members.sqlite3")
+        member_storage.MEMBER_DB_DIR = self.db_dir
+        self.worksheet = FakeWorksheet()
+        self.restart()
+
+    def tearDown(self):
+        self.close_stores()
+        member_storage.MEMBER_DB_PATH, member_storage.MEMBER_DB_DIR, stores, sheets = self.saved
+        member_storage._stores.update(stores)
+        sheets_manager._member_sheets.update(sheets)
+        shutil.rmtree(self.db_dir, ignore_errors=True)
+
+    def close_stores(self):
+        for store in member_storage._stores.values():
+            store.close()
+        member_storage._stores.clear()
+        sheets_manager._member_sheets.clear()
+
+    def restart(self):
+        """
+        Drops every in-memory store, sheet directory and queued sheet write, keeping the files and the worksheet.
+        """
+        self.close_stores()
+        sheets_manager.get_member_sheet(GUILD_ID).worksheet = self.worksheet
+
+    def sheet_steam_id(self):
+        for username, discord_id, steam_id in self.worksheet.rows[1:]:
+            if discord_id == str(DISCORD_ID):
+                return steam_id
+        return None
+
+    def test_link_survives_restart_before_flush(self):
+        member_storage.add_new_discord_user("alice", DISCORD_ID, GUILD_ID)
+        member_storage.sync_with_sheets(GUILD_ID)
+        sheets_manager.flush_pending_writes()
+        member_storage.update_user_steam_id(DISCORD_ID, STEAM_ID, GUILD_ID)
+        member_storage.sync_with_sheets(GUILD_ID)
+
+        self.restart()
+        member_storage.sync_with_sheets(GUILD_ID)
+        self.assertEqual(member_storage.get_steam_id_for_discord_id(DISCORD_ID, GUILD_ID), STEAM_ID)
+
+        sheets_manager.flush_pending_writes()
+        self.assertEqual(self.sheet_steam_id(), STEAM_ID)
+
+    def test_sheet_edits_win_once_the_write_has_landed(self):
+        member_storage.add_new_discord_user("alice", DISCORD_ID, GUILD_ID)
+        member_storage.update_user_steam_id(DISCORD_ID, STEAM_ID, GUILD_ID)
+        member_storage.sync_with_sheets(GUILD_ID)
+        sheets_manager.flush_pending_writes()
+        self.assertEqual(self.sheet_steam_id(), STEAM_ID)
+
+        self.worksheet.rows[1][2] = "76561190000000002"
+        self.restart()
+        member_storage.sync_with_sheets(GUILD_ID)
+        self.assertEqual(member_storage.get_steam_id_for_discord_id(DISCORD_ID, GUILD_ID), "76561190000000002")
+
+
+if __name__ == "__main__":
+    unittest.main()